@@ -0,0 +1,118 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from Important.query import LRUCache, SimularityQuery
+
+#--------------------------------------------------------------------------------------------------------------
+#   Async Query API
+#
+#   SQLite reads block, so they run on a small thread pool. Every worker thread opens its own read-only connection
+#   the first time it's used, so lookups from many callers run side by side instead of queueing behind one cursor.
+#   The cache and the table of in-flight lookups live on the event loop, so they need no locks: a word that's
+#   already being fetched is awaited rather than fetched again.
+#--------------------------------------------------------------------------------------------------------------
+
+class AsyncSimularityQuery:
+    '''Answers get_matches style lookups for many concurrent callers.
+    Use it from a single event loop, and close it (or use async with) when done.'''
+
+    def __init__(self, path:str, storage:str|None=None, workers:int=4, cache_size:int=4096, chunk_size:int=64):
+        self.path = path
+        with SimularityQuery(path, storage, cache_size=0) as probe:
+            self.storage = probe.storage
+        self.chunk_size = chunk_size
+        self.cache = LRUCache(cache_size)
+        self.inflight = {}
+        self.tasks = set()
+        self.coalesced = 0
+
+        # One read-only connection per worker thread, kept so they can all be closed at the end
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix='simularity')
+        self.local = threading.local()
+        self.readers = []
+        self.readers_lock = threading.Lock()
+
+    def reader(self) -> SimularityQuery:
+        "Returns this thread's connection, opening it the first time."
+        query = getattr(self.local, 'query', None)
+        if query is None:
+            # Caching happens on the event loop, so the per-thread connections don't keep their own
+            query = self.local.query = SimularityQuery(self.path, self.storage, cache_size=0, check_same_thread=False)
+            with self.readers_lock:
+                self.readers.append(query)
+        return query
+
+    def fetch(self, words:list, threshold:float) -> dict:
+        "Runs on a worker thread. Fetches a chunk of words with one query."
+        return self.reader().matches_many(words, threshold)
+
+    async def fetch_chunk(self, words:list, threshold:float):
+        "Fetches a chunk of words on the pool and hands each result to whoever is waiting on it."
+        futures = [self.inflight[(word, threshold)] for word in words]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.pool, self.fetch, words, threshold)
+        except Exception as error:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+        else:
+            for word, future in zip(words, futures):
+                self.cache.put((word, threshold), results[word])
+                if not future.done():
+                    future.set_result(results[word])
+        finally:
+            for word in words:
+                del self.inflight[(word, threshold)]
+
+    async def matches_many(self, words:list, threshold:float=0.5) -> dict[str, list[tuple[str, float]]]:
+        '''Returns {word: [(word, sim), ...]} for every word, most similar first.
+        Words that aren't cached or already being fetched are split into chunks and fetched across the pool.'''
+        threshold = float(threshold)
+        loop = asyncio.get_running_loop()
+        results = {}
+        waiting = {}
+        missing = []
+
+        for word in dict.fromkeys(words):
+            key = (word, threshold)
+            matches = self.cache.get(key)
+            if matches is not None:
+                results[word] = matches
+            elif key in self.inflight:
+                self.coalesced += 1
+                waiting[word] = self.inflight[key]
+            else:
+                self.inflight[key] = waiting[word] = loop.create_future()
+                missing.append(word)
+
+        # The loop only keeps weak references to tasks, so hold on to them until they finish
+        for start in range(0, len(missing), self.chunk_size):
+            task = loop.create_task(self.fetch_chunk(missing[start:start + self.chunk_size], threshold))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        # Other callers may be waiting on the same futures, so one caller giving up mustn't cancel them
+        if waiting:
+            for word, matches in zip(waiting, await asyncio.gather(*map(asyncio.shield, waiting.values()))):
+                results[word] = matches
+        return results
+
+    async def matches(self, word:str, threshold:float=0.5) -> list[tuple[str, float]]:
+        "Returns [(word, sim), ...] for every word more similar than threshold, most similar first."
+        return (await self.matches_many([word], threshold))[word]
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        for query in self.readers:
+            query.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        self.close()
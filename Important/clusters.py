@@ -0,0 +1,149 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import sqlite3
+
+import numpy as np
+
+#--------------------------------------------------------------------------------------------------------------
+#   Clustering
+#
+#   Lemmas are grouped into synonym buckets with spherical mini-batch k-means over their unit vectors. The centroids
+#   start as k-means++ picks from a sample of the lemmas. Each training step then pulls a random batch of lemmas, finds
+#   every one's most similar centroid, and moves those centroids a little towards them (less the more lemmas a centroid
+#   has already seen). A few full passes of plain k-means settle the result: every lemma is assigned to its most similar
+#   centroid a block at a time, and the centroids are worked out again from their actual members. Each lemma is saved
+#   with its simularity to its own centroid, and the member closest to the centroid is the cluster's canonical word.
+#
+#   Only the centroids, the seeding sample, one batch and one block of lemma x centroid simularities are ever in memory
+#   on top of the labels, so the vectors can stay in the memory mapped vector cache. Lemmas with no vector aren't clustered.
+#--------------------------------------------------------------------------------------------------------------
+
+# Roughly how many bytes one cell of a block costs: the float32 simularity and the float32 copy argmax works over.
+bytes_per_cell = 8
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def create_cluster_table(cursor:sqlite3.Cursor):
+    '''Creates the cluster table, keyed by word so a word's cluster is one read. The index keeps each cluster's members
+    together in order of how central they are, so finding the canonical word is one more read.'''
+    cursor.execute("CREATE TABLE IF NOT EXISTS clusters (word TEXT PRIMARY KEY, cluster_id INTEGER, centroid_sim REAL) WITHOUT ROWID")
+    cursor.execute("CREATE INDEX IF NOT EXISTS cluster_index ON clusters (cluster_id, centroid_sim)")
+
+def normalize_rows(rows:np.ndarray) -> np.ndarray:
+    "Returns a float32 copy of rows scaled to unit length. Zero rows stay zero."
+    rows = np.asarray(rows, dtype=np.float32)
+    norms = np.linalg.norm(rows, axis=1)
+    return rows / np.where(norms == 0, 1, norms)[:, None]
+
+def rows_per_block(columns:int, memory_budget:int) -> int:
+    "Returns how many lemmas go into one block so a block x columns slice stays under the memory budget."
+    return max(1, memory_budget // (max(columns, 1) * bytes_per_cell))
+
+def seed_centroids(vectors:np.ndarray, clusters:int, sample:int, rng:np.random.Generator) -> np.ndarray:
+    '''Picks the starting centroids with k-means++ over a random sample of the lemmas: each one is a lemma picked with
+    a chance that grows with how far it is from the nearest centroid picked so far. Spreading them out like this keeps
+    far fewer clusters sharing what should be one bucket than starting from random lemmas does.'''
+    data = normalize_rows(vectors[np.sort(rng.choice(len(vectors), min(len(vectors), max(sample, clusters)), replace=False))])
+    data = data[data.any(axis=1)]
+    centroids = np.zeros((clusters, vectors.shape[1]), dtype=np.float32)
+    centroids[0] = data[rng.integers(len(data))]
+    best = data @ centroids[0]
+    for i in range(1, clusters):
+        # For unit vectors the squared distance to a centroid is 2 - 2 x simularity
+        distance = np.maximum(1 - best, 0).astype(np.float64)
+        total = distance.sum()
+        pick = rng.choice(len(data), p=distance / total) if total > 0 else rng.integers(len(data))
+        centroids[i] = data[pick]
+        np.maximum(best, data @ centroids[i], out=best)
+    return centroids
+
+def train_centroids(vectors:np.ndarray, clusters:int, steps:int, batch:int, rng:np.random.Generator, sample:int=0, on_step=None) -> np.ndarray:
+    '''Spherical mini-batch k-means. Starts from k-means++ picks out of sample lemmas, returns clusters unit length centroids.
+    vectors can be a memory mapped matrix: only one batch of rows is ever read out of it at a time.
+    on_step is called after every step.'''
+    length = len(vectors)
+    centroids = seed_centroids(vectors, clusters, sample, rng)
+    seen = np.zeros(clusters, dtype=np.float32)
+
+    for _ in range(steps):
+        data = normalize_rows(vectors[np.sort(rng.choice(length, min(batch, length), replace=False))])
+        data = data[data.any(axis=1)]
+        labels = (data @ centroids.T).argmax(axis=1)
+
+        # Each centroid moves towards the mean of its share of the batch, by its share of everything it's seen
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        counts = np.bincount(labels, minlength=clusters).astype(np.float32)
+        seen += counts
+        hit = counts > 0
+        centroids[hit] += (sums[hit] - counts[hit, None] * centroids[hit]) / seen[hit, None]
+        centroids = normalize_rows(centroids)
+
+        if on_step is not None:
+            on_step()
+    return centroids
+
+def assign_clusters(vectors:np.ndarray, centroids:np.ndarray, memory_budget:int, on_block=None) -> np.ndarray:
+    '''Returns the index of every lemma's most similar centroid, or -1 for a lemma with no vector.
+    Works through the lemmas a block at a time. on_block is called with the size of every block once it's done.'''
+    length = len(vectors)
+    labels = np.empty(length, dtype=np.int64)
+    block = rows_per_block(centroids.shape[0] + centroids.shape[1], memory_budget)
+    for start in range(0, length, block):
+        stop = min(start + block, length)
+        data = normalize_rows(vectors[start:stop])
+        labels[start:stop] = (data @ centroids.T).argmax(axis=1)
+        labels[start:stop][~data.any(axis=1)] = -1
+        if on_block is not None:
+            on_block(stop - start)
+    return labels
+
+def member_centroids(vectors:np.ndarray, labels:np.ndarray, clusters:int, memory_budget:int) -> np.ndarray:
+    "Returns every cluster's unit length centroid worked out from the lemmas actually assigned to it."
+    sums = np.zeros((clusters, vectors.shape[1]), dtype=np.float32)
+    block = rows_per_block(vectors.shape[1], memory_budget)
+    for start in range(0, len(vectors), block):
+        stop = min(start + block, len(vectors))
+        keep = labels[start:stop] >= 0
+        np.add.at(sums, labels[start:stop][keep], normalize_rows(vectors[start:stop])[keep])
+    return normalize_rows(sums)
+
+def iter_clusters(words:list, vectors:np.ndarray, clusters:int, memory_budget:int, steps:int, batch:int, refinements:int=2, sample:int=20000, seed:int=0, on_step=None, on_block=None):
+    '''Yields (word, cluster_id, centroid_sim) for every lemma with a vector, in word order.
+    Cluster ids are numbered from 0 with no gaps, in order of each cluster's first word.'''
+    length = len(words)
+    clusters = min(clusters, length)
+    if clusters <= 0:
+        return
+
+    rng = np.random.default_rng(seed)
+    centroids = train_centroids(vectors, clusters, steps, batch, rng, sample, on_step)
+
+    # Full passes of plain k-means to settle the trained centroids. A cluster that empties out keeps its old centroid.
+    for _ in range(refinements + 1):
+        labels = assign_clusters(vectors, centroids, memory_budget, on_block)
+        members = member_centroids(vectors, labels, clusters, memory_budget)
+        empty = ~members.any(axis=1)
+        members[empty] = centroids[empty]
+        centroids = members
+
+    # Clusters that ended up with no members leave no gaps
+    ids = np.full(clusters, -1, dtype=np.int64)
+    used = labels[labels >= 0]
+    _, first = np.unique(used, return_index=True)
+    order = used[np.sort(first)]
+    ids[order] = np.arange(len(order))
+
+    block = rows_per_block(vectors.shape[1], memory_budget)
+    for start in range(0, length, block):
+        stop = min(start + block, length)
+        block_labels = labels[start:stop]
+        keep = np.nonzero(block_labels >= 0)[0]
+        data = normalize_rows(vectors[start:stop])[keep]
+        sims = np.einsum('ij,ij->i', data, centroids[block_labels[keep]])
+        for row, cluster_id, sim in zip((start + keep).tolist(), ids[block_labels[keep]].tolist(), np.round(sims.astype(np.float64), 5).tolist()):
+            yield words[row], cluster_id, sim
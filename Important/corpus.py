@@ -0,0 +1,100 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import codecs
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, Iterator, TextIO
+
+from Important.normalize import normalize_word
+
+#--------------------------------------------------------------------------------------------------------------
+#   Settings
+#--------------------------------------------------------------------------------------------------------------
+
+# ASCII whitespace bytes. A piece of a file is only ever cut at one of these, so no word or UTF-8 character is split in two.
+whitespace_bytes = b' \t\n\r\x0b\x0c'
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def split_chunks(chunks:Iterable[str]) -> Iterator[str]:
+    '''Yields the raw words from a stream of text chunks.
+    Hyphens are treated as spaces, as they are often used to connect words. A word cut off at the end of a chunk is carried into the next one.'''
+    leftover = ''
+    for chunk in chunks:
+        chunk = leftover + chunk.replace('-', ' ')
+        words = chunk.split()
+
+        # If the chunk doesn't end on whitespace, its last word might carry on in the next chunk
+        leftover = words.pop() if words and not chunk[-1].isspace() else ''
+        yield from words
+
+    if leftover:
+        yield leftover
+
+def read_words(file:TextIO, chunk_size:int=64 * 1024) -> Iterator[str]:
+    "Yields the raw words of an open text file, reading chunk_size characters at a time."
+    return split_chunks(iter(lambda: file.read(chunk_size), ''))
+
+def read_range(path:str, start:int, stop:int, chunk_size:int=64 * 1024) -> Iterator[str]:
+    "Yields the text between two byte offsets of a UTF-8 file, chunk_size bytes at a time."
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = stop - start
+        while remaining > 0 and (data := file.read(min(chunk_size, remaining))):
+            remaining -= len(data)
+            yield decoder.decode(data, final=remaining <= 0)
+
+def distinct_words(words:Iterable[str], seen:set) -> Iterator[str]:
+    "Normalizes the words and yields only the ones not already in seen, adding them to it as it goes."
+    for word in words:
+        word = normalize_word(word)
+        if word not in seen:
+            seen.add(word)
+            yield word
+
+def word_ranges(path:str, piece_size:int) -> list[tuple[int, int]]:
+    "Splits a file into (start, stop) byte ranges of roughly piece_size bytes, each one cut at whitespace."
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as file:
+        start = 0
+        while start < size:
+            stop = min(start + piece_size, size)
+
+            # Walk forward to the next whitespace byte so the cut falls between two words
+            file.seek(stop)
+            while stop < size and file.read(1) not in whitespace_bytes:
+                stop += 1
+
+            ranges.append((start, stop))
+            start = stop
+    return ranges
+
+def collect_words(path:str, start:int=0, stop:int|None=None, chunk_size:int=64 * 1024) -> set:
+    "Returns the set of normalized words in a byte range of a text file. This is what each worker process runs."
+    stop = os.path.getsize(path) if stop is None else stop
+    return set(map(normalize_word, split_chunks(read_range(path, start, stop, chunk_size))))
+
+def word_tasks(paths:list, piece_size:int) -> list[tuple[str, int, int]]:
+    "Returns the (path, start, stop) pieces the files are read in, one task each."
+    return [(path, start, stop) for path in paths for start, stop in word_ranges(path, piece_size)]
+
+def parallel_words(paths:list, workers:int, piece_size:int, chunk_size:int=64 * 1024) -> Iterator[tuple[int, int, str, set]]:
+    '''Fans the files out over a process pool, one task per piece, and yields (done, total, path, words) as each piece finishes.
+    The pool never has more workers than pieces. With one piece (or one worker) there's no pool: starting one costs more
+    than it saves, so the piece is read in this process.'''
+    tasks = word_tasks(paths, piece_size)
+    if len(tasks) <= 1 or workers <= 1:
+        for done, (path, start, stop) in enumerate(tasks, start=1):
+            yield done, len(tasks), path, collect_words(path, start, stop, chunk_size)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        futures = {pool.submit(collect_words, path, start, stop, chunk_size): path for path, start, stop in tasks}
+        for done, future in enumerate(as_completed(futures), start=1):
+            yield done, len(tasks), futures[future], future.result()
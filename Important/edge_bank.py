@@ -0,0 +1,209 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import heapq
+import mmap
+import sqlite3
+import struct
+from array import array
+
+#--------------------------------------------------------------------------------------------------------------
+#   Format
+#
+#   A bank is one little-endian file, made to be mapped into memory and read in place with no parsing.
+#   Every section starts on a 4 byte boundary, so a C reader on the device can point straight into it.
+#
+#     header               see header_format below
+#     word offsets         uint32 x (words + 1)   where each word starts in the string data, the last one is the end
+#     string data          every word in UTF-8, sorted by bytes, back to back. Binary search runs over these.
+#     neighbour offsets    uint32 x (words + 1)   where each word's neighbours start in the two arrays below
+#     neighbour ids        uint16 x neighbours    the neighbour's position in the word list
+#     neighbour sims       uint8 x neighbours     the simularity, quantized between the header's low and high values
+#
+#   Each word's neighbours are stored most similar first, so a lookup can stop at the first one under its threshold.
+#--------------------------------------------------------------------------------------------------------------
+
+magic = b'WSB1'
+version = 1
+
+# magic, version, padding, word count, quantization low, quantization high, then where each section starts
+header_format = '<4sHHIffIIIII'
+header_size = struct.calcsize(header_format)
+
+# Neighbour ids are uint16, so that's as many words as a bank can hold
+max_words = 0xFFFF
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def pad(data:bytearray, alignment:int=4):
+    "Pads data with zeros up to the next multiple of alignment."
+    data.extend(b'\0' * (-len(data) % alignment))
+
+def quantize(sim:float, low:float, high:float) -> int:
+    "Squeezes a simularity between low and high into a single byte."
+    if high <= low:
+        return 255
+    return max(0, min(255, round((sim - low) / (high - low) * 255)))
+
+def dequantize(value:int, low:float, high:float) -> float:
+    "Turns a quantized byte back into a simularity."
+    return low + value * (high - low) / 255
+
+def sort_words(words) -> list:
+    "Sorts words by their UTF-8 bytes, the order readers binary search them in."
+    return sorted(words, key=lambda word: word.encode('utf-8'))
+
+def pack_words(words:list) -> tuple[array, bytearray]:
+    "Returns the uint32 word offsets (with the end as the last one) and the string data for an already sorted word list."
+    strings = bytearray()
+    word_offsets = array('I')
+    for word in words:
+        word_offsets.append(len(strings))
+        strings.extend(word.encode('utf-8'))
+    word_offsets.append(len(strings))
+    return word_offsets, strings
+
+def little_endian(section:array) -> bytes:
+    "Returns an array's bytes in little-endian order, whatever machine is writing it."
+    if struct.pack('=I', 1) != struct.pack('<I', 1):
+        section = array(section.typecode, section)
+        section.byteswap()
+    return section.tobytes()
+
+def word_at(data, word_offsets_at:int, strings_at:int, i:int) -> bytes:
+    "Returns word i of a packed word table as UTF-8 bytes."
+    start, stop = struct.unpack_from('<II', data, word_offsets_at + i * 4)
+    return data[strings_at + start:strings_at + stop]
+
+def find_word(data, word_offsets_at:int, strings_at:int, count:int, word:str) -> int:
+    "Binary searches a packed word table for a word and returns its id, or -1 if it isn't there."
+    target = word.encode('utf-8')
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        if word_at(data, word_offsets_at, strings_at, middle) < target:
+            low = middle + 1
+        else:
+            high = middle
+    return low if low < count and word_at(data, word_offsets_at, strings_at, low) == target else -1
+
+def read_neighbours(db:sqlite3.Connection, k:int, floor:float) -> dict:
+    '''Returns {word: [(other, sim), ...]} with up to k neighbours per word at or above floor, most similar first.
+    Reads the neighbours table if it's been built, otherwise picks the top k out of the simularity table with one pass over it.'''
+    cursor = db.cursor()
+    tables = set(name for name, in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'"))
+    neighbours = {}
+
+    if 'neighbours' in tables and cursor.execute("SELECT 1 FROM neighbours LIMIT 1").fetchone():
+        for word, other, sim in cursor.execute("SELECT word, other, sim FROM neighbours WHERE sim >= ? ORDER BY word, rank", (floor,)):
+            if len(neighbours.setdefault(word, [])) < k:
+                neighbours[word].append((other, sim))
+        return neighbours
+
+    # Keep a small heap per word, so memory grows with words x k rather than with the number of pairs
+    heaps = {}
+    for word1, word2, sim in cursor.execute("SELECT word1, word2, sim FROM simularity WHERE sim >= ?", (floor,)):
+        for word, other in ((word1, word2), (word2, word1)):
+            heap = heaps.setdefault(word, [])
+            if len(heap) < k:
+                heapq.heappush(heap, (sim, other))
+            elif sim > heap[0][0]:
+                heapq.heapreplace(heap, (sim, other))
+
+    for word, heap in heaps.items():
+        neighbours[word] = [(other, sim) for sim, other in sorted(heap, key=lambda item: (-item[0], item[1]))]
+    return neighbours
+
+def write_bank(path:str, neighbours:dict) -> int:
+    "Writes a bank file from {word: [(other, sim), ...]}. Returns the size of the file in bytes."
+
+    # Every word that shows up anywhere gets an id, in sorted byte order so the reader can binary search them
+    words = sort_words(set(neighbours) | set(other for pairs in neighbours.values() for other, _ in pairs))
+    if len(words) > max_words:
+        raise ValueError(f"A bank can hold at most {max_words} words, but there are {len(words)}.")
+    ids = {word: i for i, word in enumerate(words)}
+
+    # Quantize over the range that's actually used, to get the most out of each byte
+    sims = [sim for pairs in neighbours.values() for _, sim in pairs]
+    low, high = (min(sims), max(sims)) if sims else (0.0, 1.0)
+
+    # Word strings and where each one starts
+    word_offsets, strings = pack_words(words)
+
+    # Neighbour lists and where each word's list starts
+    neighbour_offsets = array('I')
+    neighbour_ids = array('H')
+    neighbour_sims = bytearray()
+    for word in words:
+        neighbour_offsets.append(len(neighbour_ids))
+        for other, sim in neighbours.get(word, []):
+            neighbour_ids.append(ids[other])
+            neighbour_sims.append(quantize(sim, low, high))
+    neighbour_offsets.append(len(neighbour_ids))
+
+    # Lay the sections out one after another, each on a 4 byte boundary
+    body = bytearray(header_size)
+    sections = []
+    for section in (word_offsets, strings, neighbour_offsets, neighbour_ids, neighbour_sims):
+        sections.append(len(body))
+        body.extend(little_endian(section) if isinstance(section, array) else section)
+        pad(body)
+
+    struct.pack_into(header_format, body, 0, magic, version, 0, len(words), low, high, *sections)
+    with open(path, 'wb') as file:
+        file.write(body)
+    return len(body)
+
+#--------------------------------------------------------------------------------------------------------------
+#   Reader
+#--------------------------------------------------------------------------------------------------------------
+
+class EdgeBank:
+    "Reads a bank file straight out of a memory map. Nothing is loaded up front, so opening one is instant whatever its size."
+
+    def __init__(self, path:str):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = struct.unpack_from(header_format, self.map, 0)
+        if header[0] != magic:
+            raise ValueError(f"{path} is not a simularity bank.")
+        (_, self.version, _, self.word_count, self.low, self.high,
+         self.word_offsets_at, self.strings_at, self.neighbour_offsets_at, self.ids_at, self.sims_at) = header
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def word(self, i:int) -> str:
+        "Returns word i."
+        return word_at(self.map, self.word_offsets_at, self.strings_at, i).decode('utf-8')
+
+    def find(self, word:str) -> int:
+        "Binary searches for a word and returns its id, or -1 if the bank doesn't have it."
+        return find_word(self.map, self.word_offsets_at, self.strings_at, self.word_count, word)
+
+    def get_matches(self, word:str, sim:float=0.5) -> list:
+        "Returns the words more similar than sim to word, most similar first. Same as get_matches, read from the bank."
+        i = self.find(word)
+        if i < 0:
+            return []
+
+        start, stop = struct.unpack_from('<II', self.map, self.neighbour_offsets_at + i * 4)
+        ids = struct.unpack_from(f'<{stop - start}H', self.map, self.ids_at + start * 2)
+        sims = self.map[self.sims_at + start:self.sims_at + stop]
+
+        matches = []
+        for other, value in zip(ids, sims):
+            if dequantize(value, self.low, self.high) <= float(sim):
+                break
+            matches.append(self.word(other))
+        return matches
@@ -0,0 +1,111 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+#--------------------------------------------------------------------------------------------------------------
+#   Manifest
+#
+#   Every stage keeps one row in the manifest table of the database it writes to: a fingerprint of what it's working
+#   on (the corpus, the lemmas, the settings), how far it got, and whether it finished. A stage updates its
+#   checkpoint in the same transaction as the batch it just wrote, so the checkpoint is never ahead of the data.
+#   A restarted stage with the same fingerprint picks up from the checkpoint, and a finished one is skipped.
+#
+#   The texts are fingerprinted by their SHA-256, which is only worked out again when a file's size or
+#   modification time has changed. An unchanged corpus is recognised from a stat() per file.
+#--------------------------------------------------------------------------------------------------------------
+
+# Bytes read at a time while hashing a text
+hash_chunk_size = 1024 * 1024
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def create_manifest_table(cursor:sqlite3.Cursor):
+    "Creates the manifest table, and the table of corpus file hashes."
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS manifest (
+        stage TEXT PRIMARY KEY,
+        fingerprint TEXT,
+        checkpoint,
+        done INTEGER,
+        complete INTEGER,
+        settings TEXT,
+        updated REAL
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE TABLE IF NOT EXISTS corpus_files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT) WITHOUT ROWID")
+
+def fingerprint(*parts) -> str:
+    "Returns a short hash of anything JSON can hold. Equal parts always give the same fingerprint."
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:32]
+
+def file_hash(path:str) -> str:
+    "Returns the SHA-256 of a file, read a chunk at a time."
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(hash_chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def corpus_fingerprint(cursor:sqlite3.Cursor, paths:list) -> str:
+    '''Returns a fingerprint of the texts' contents. A text is only hashed again if its size or modification time
+    doesn't match the last time it was seen. The caller commits the updated hashes.'''
+    hashes = []
+    for path in paths:
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        row = cursor.execute("SELECT size, mtime_ns, sha256 FROM corpus_files WHERE path = ?", (key,)).fetchone()
+        if row is not None and row[:2] == (stat.st_size, stat.st_mtime_ns):
+            sha256 = row[2]
+        else:
+            sha256 = file_hash(path)
+            cursor.execute("INSERT OR REPLACE INTO corpus_files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)", (key, stat.st_size, stat.st_mtime_ns, sha256))
+        hashes.append(sha256)
+    return fingerprint(hashes)
+
+def read_stage(cursor:sqlite3.Cursor, stage:str) -> dict|None:
+    "Returns a stage's manifest row as a dict, or None if it has never run."
+    row = cursor.execute("SELECT fingerprint, checkpoint, done, complete, settings, updated FROM manifest WHERE stage = ?", (stage,)).fetchone()
+    if row is None:
+        return None
+    return {
+        "fingerprint": row[0],
+        "checkpoint": row[1],
+        "done": row[2],
+        "complete": bool(row[3]),
+        "settings": json.loads(row[4]) if row[4] else {},
+        "updated": row[5],
+    }
+
+def is_complete(cursor:sqlite3.Cursor, stage:str, fingerprint:str) -> bool:
+    "Checks if a stage already finished with exactly this fingerprint."
+    row = read_stage(cursor, stage)
+    return row is not None and row["complete"] and row["fingerprint"] == fingerprint
+
+def start_stage(cursor:sqlite3.Cursor, stage:str, fingerprint:str, settings:dict|None=None):
+    '''Returns the checkpoint to resume from if the stage stopped part way through with the same fingerprint.
+    Otherwise starts it over and returns None. The caller commits.'''
+    row = read_stage(cursor, stage)
+    if row is not None and not row["complete"] and row["fingerprint"] == fingerprint and row["checkpoint"] is not None:
+        return row["checkpoint"]
+
+    cursor.execute(
+        "INSERT OR REPLACE INTO manifest (stage, fingerprint, checkpoint, done, complete, settings, updated) VALUES (?, ?, NULL, 0, 0, ?, ?)",
+        (stage, fingerprint, json.dumps(settings or {}, sort_keys=True), time.time()),
+    )
+    return None
+
+def save_checkpoint(cursor:sqlite3.Cursor, stage:str, checkpoint, done:int):
+    "Records how far a stage has got. Call it before committing the batch it describes, so both land together."
+    cursor.execute("UPDATE manifest SET checkpoint = ?, done = ?, updated = ? WHERE stage = ?", (checkpoint, done, time.time(), stage))
+
+def complete_stage(cursor:sqlite3.Cursor, stage:str, done:int):
+    "Marks a stage as finished. Like save_checkpoint, it lands with the caller's next commit."
+    cursor.execute("UPDATE manifest SET complete = 1, done = ?, updated = ? WHERE stage = ?", (done, time.time(), stage))
@@ -0,0 +1,135 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import math
+
+import numpy as np
+
+#--------------------------------------------------------------------------------------------------------------
+#   Settings
+#--------------------------------------------------------------------------------------------------------------
+
+# Roughly how many bytes one compared pair costs while a block is alive: the float32 dot product and the norms it's
+# divided by, its indices, the float64 copy used for rounding, and the (word1, word2, sim) tuple handed to executemany.
+bytes_per_pair = 128
+
+# How far from a rounding midpoint a float32 matrix result has to be before it's trusted as-is.
+# Anything closer is recomputed with spaCy's own scalar formula so the rounded value matches exactly.
+    # Tiles use the same formula, but BLAS adds up a matrix product in a different order than a single dot product.
+    # Over 6 million pairs of heavy tailed 300 wide vectors the two never drifted more than 5.4e-7 apart (tiles of unit
+    # length rows, as they used to be, drifted up to 1.3e-6), so this leaves a margin of more than five.
+rounding_tolerance = 3e-6
+
+# Number of decimal places simularities are stored with.
+decimals = 5
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def vector_norm(vector:np.ndarray) -> np.float32:
+    "Returns the norm of a vector, calculated the same way spaCy's Token.vector_norm is."
+    total = (vector ** 2).sum()
+    return np.sqrt(total) if total != 0 else np.float32(0)
+
+def pair_similarity(vector1:np.ndarray, vector2:np.ndarray, norm1:np.float32, norm2:np.float32) -> float:
+    "Returns the simularity of two vectors, calculated the same way spaCy's Token.similarity is."
+    if norm1 == 0 or norm2 == 0:
+        return 0.0
+    return (np.dot(vector1, vector2) / (norm1 * norm2)).item()
+
+def similarity_tile(matrix:np.ndarray, norms:np.ndarray, rows, cols) -> np.ndarray:
+    '''Returns the float32 simularities of the rows x cols tile, worked out with pair_similarity's formula: the dot
+    products of the vectors as-is, divided by the products of their norms. Pairs with a zero vector come out as 0.'''
+    tile = matrix[rows] @ matrix[cols].T
+    products = norms[rows][:, None] * norms[cols][None, :]
+    zero = products == 0
+    tile /= np.where(zero, np.float32(1), products)
+    tile[zero] = 0
+    return tile
+
+def row_norms(matrix:np.ndarray) -> np.ndarray:
+    "Returns the norm of every row of a matrix, each calculated the same way vector_norm does."
+    return np.array([vector_norm(row) for row in matrix], dtype=np.float32)
+
+def build_matrix(vectors) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    "Stacks the vectors into one float32 matrix. Returns it with every row scaled to unit length, as-is, and the row norms."
+    matrix = np.array(vectors, dtype=np.float32)
+    norms = row_norms(matrix)
+
+    # Zero vectors stay zero, so they come out with a simularity of 0 just like spaCy gives them.
+    scale = np.where(norms == 0, 1, norms).astype(np.float32)
+    normalized = matrix / scale[:, None]
+    return normalized, matrix, norms
+
+def block_size(length:int, memory_budget:int) -> int:
+    "Returns how many rows go into one block so a block x block tile of pairs stays under the memory budget."
+    return max(1, min(length, int(math.sqrt(memory_budget / bytes_per_pair))))
+
+def iter_upper_triangle(matrix:np.ndarray, norms:np.ndarray, memory_budget:int, first_block:int=0):
+    '''Yields (block, rows, cols, sims) for every pair above the diagonal, one tile at a time. sims are unrounded float32.
+    block counts the row blocks. Once a higher one shows up, every tile of the ones before it has been yielded.
+    Starts from row block first_block, to resume a run that stopped part way through.'''
+    length = len(matrix)
+    block = block_size(length, memory_budget)
+
+    for start in range(first_block * block, length, block):
+        stop = min(start + block, length)
+        for start2 in range(start, length, block):
+            stop2 = min(start2 + block, length)
+            tile = similarity_tile(matrix, norms, slice(start, stop), slice(start2, stop2))
+
+            # Tiles on the diagonal only keep the pairs above it, every other tile is kept whole.
+            if start == start2:
+                rows, cols = np.triu_indices(stop - start, k=1)
+            else:
+                rows, cols = np.indices(tile.shape).reshape(2, -1)
+
+            # A lone word left on the diagonal has nothing to pair with
+            if len(rows) == 0:
+                continue
+
+            yield start // block, rows + start, cols + start2, tile[rows, cols]
+
+def iter_new_pairs(matrix:np.ndarray, norms:np.ndarray, new_rows:np.ndarray, memory_budget:int, first_block:int=0):
+    '''Yields (block, rows, cols, sims) for every pair that has at least one of new_rows in it, one tile at a time, with rows < cols.
+    Only new x all is ever multiplied, so the work grows with the number of new rows rather than with the square of every row.
+    block and first_block count blocks of new rows, the same way as iter_upper_triangle.'''
+    length = len(matrix)
+    block = block_size(length, memory_budget)
+    new_rows = np.asarray(new_rows, dtype=np.int64)
+    is_new = np.zeros(length, dtype=bool)
+    is_new[new_rows] = True
+
+    for start in range(first_block * block, len(new_rows), block):
+        rows_block = new_rows[start:start + block]
+        for start2 in range(0, length, block):
+            stop2 = min(start2 + block, length)
+            tile = similarity_tile(matrix, norms, rows_block, slice(start2, stop2))
+
+            # Pairs with an old word are always kept. Pairs of two new words only once, from the smaller row.
+            rows, cols = np.indices(tile.shape).reshape(2, -1)
+            rows, cols, sims = rows_block[rows], cols + start2, tile[rows, cols]
+            keep = ~is_new[cols] | (cols > rows)
+            if not keep.any():
+                continue
+
+            rows, cols, sims = rows[keep], cols[keep], sims[keep]
+            yield start // block, np.minimum(rows, cols), np.maximum(rows, cols), sims
+
+def round_similarities(rows:np.ndarray, cols:np.ndarray, sims:np.ndarray, matrix:np.ndarray, norms:np.ndarray) -> list:
+    "Rounds a tile of simularities the way the pairwise check does. Values close to a rounding midpoint are recomputed exactly."
+    sims = sims.astype(np.float64)
+
+    # Distance from the nearest x.xxxxx5 midpoint, in units of the last stored decimal place.
+    scaled = sims * 10 ** decimals
+    distance = np.abs(scaled - np.floor(scaled) - 0.5)
+    unsure = np.nonzero(distance < rounding_tolerance * 10 ** decimals)[0]
+
+    sims = sims.tolist()
+    for index in unsure.tolist():
+        row, col = rows[index], cols[index]
+        sims[index] = pair_similarity(matrix[row], matrix[col], norms[row], norms[col])
+
+    return [round(sim, decimals) for sim in sims]
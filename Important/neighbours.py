@@ -0,0 +1,70 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import sqlite3
+
+import numpy as np
+
+from Important.matrix import round_similarities, similarity_tile
+
+#--------------------------------------------------------------------------------------------------------------
+#   Settings
+#--------------------------------------------------------------------------------------------------------------
+
+# Roughly how many bytes one cell of a block costs: the float32 simularity, the float32 norms it's divided by,
+# and the int64 index from argpartition.
+bytes_per_cell = 20
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def create_neighbour_table(cursor:sqlite3.Cursor):
+    "Creates the neighbour table. Rows are clustered by word, so all of a word's neighbours sit next to each other on disk."
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS neighbours (
+        word TEXT,
+        rank INTEGER,
+        other TEXT,
+        sim REAL,
+        PRIMARY KEY (word, rank)
+        ) WITHOUT ROWID;
+    """)
+
+def rows_per_block(length:int, memory_budget:int) -> int:
+    "Returns how many words go into one block so a block x length slice of simularities stays under the memory budget."
+    return max(1, min(length, memory_budget // (max(length, 1) * bytes_per_cell)))
+
+def iter_neighbours(matrix:np.ndarray, norms:np.ndarray, k:int, floor:float, memory_budget:int):
+    "Yields (row, cols, sims) with the top k neighbours of every row that are at or above floor, most similar first."
+    length = len(matrix)
+    k = min(k, length - 1)
+    if k <= 0:
+        return
+
+    block = rows_per_block(length, memory_budget)
+    for start in range(0, length, block):
+        stop = min(start + block, length)
+        tile = similarity_tile(matrix, norms, slice(start, stop), slice(None))
+
+        # A word is never its own neighbour
+        tile[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+        # Pull out the k best of each row, then put just those k in order
+        top = np.argpartition(-tile, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(tile, top, axis=1)
+        order = np.argsort(-top_sims, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_sims = np.take_along_axis(top_sims, order, axis=1)
+
+        for offset in range(stop - start):
+            keep = top_sims[offset] >= floor
+            yield start + offset, top[offset][keep], top_sims[offset][keep]
+
+def neighbour_rows(words:list, matrix:np.ndarray, norms:np.ndarray, k:int, floor:float, memory_budget:int):
+    "Yields (word, rank, other, sim) rows for the neighbour table, rounded the same way the simularity table is."
+    for row, cols, sims in iter_neighbours(matrix, norms, k, floor, memory_budget):
+        sims = round_similarities(np.full(len(cols), row), cols, sims, matrix, norms)
+        for rank, (col, sim) in enumerate(zip(cols.tolist(), sims)):
+            yield words[row], rank, words[col], sim
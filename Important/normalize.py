@@ -0,0 +1,45 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import re
+
+#--------------------------------------------------------------------------------------------------------------
+#   Settings
+#--------------------------------------------------------------------------------------------------------------
+
+# Deadspace and punctuation stripped off both ends of every word.
+strip_characters = '.,!?";.”-“,(—:)—“’‘'
+
+# Curly apostrophe contractions and what they become. A possessive ’s is dropped, everything else just gets a straight apostrophe.
+contractions = {
+    '’s': "",
+    '’t': "'t",
+    '’ll': "'ll",
+    '’ve': "'ve",
+    '’re': "'re",
+    '’d': "'d",
+    '’m': "'m",
+    '’em': "'em",
+    '’clock': "'clock",
+    '’cos': "'cos",
+    '’twas': "'twas",
+}
+
+# Every contraction other than ’s only swaps the apostrophe, so one pattern that looks ahead for any of their endings covers them all.
+apostrophe_pattern = re.compile("’(?=" + "|".join(sorted((key[1:] for key, value in contractions.items() if value), key=len, reverse=True)) + ")")
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def normalize_word(word:str) -> str:
+    "Gets rid of deadspace, punctuation, and makes the word lowercase to normalize it. Curly apostrophe contractions are straightened out."
+    word = word.strip(strip_characters).lower()
+
+    # Most words have no curly apostrophe at all, so they skip the contraction work entirely
+    if '’' in word:
+        # ’s goes first, since dropping it can leave another apostrophe right in front of a contraction
+        word = word.replace('’s', "")
+        word = apostrophe_pattern.sub("'", word)
+    return word
@@ -0,0 +1,190 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import mmap
+import struct
+
+import numpy as np
+
+from Important.edge_bank import find_word, little_endian, pack_words, pad, sort_words
+
+#--------------------------------------------------------------------------------------------------------------
+#   Format
+#
+#   Product quantization cuts every (unit length) vector into equal subspaces and replaces each piece with the id
+#   of its nearest centroid in that subspace's codebook, so a word costs one byte per subspace instead of 1200.
+#   A bank is one little-endian file, every section on a 4 byte boundary:
+#
+#     header        see header_format below
+#     word offsets  uint32 x (words + 1), then the sorted UTF-8 string data, the same layout as an edge bank
+#     codebooks     float32 x subspaces x centroids x (dimensions / subspaces)
+#     codes         uint8 x words x subspaces
+#
+#   Simularities are worked out at query time: the query's own codes are decoded, dotted with every centroid to
+#   fill a small subspaces x centroids lookup table, and each word's approximate simularity is the sum of the
+#   table entries its codes pick out. The bank grows with the vocabulary instead of with every pair.
+#--------------------------------------------------------------------------------------------------------------
+
+magic = b'WPQ1'
+version = 1
+
+# magic, version, padding, word count, dimensions, subspaces, centroids, then where each section starts
+header_format = '<4sHHIIIIIIII'
+header_size = struct.calcsize(header_format)
+
+# Codes are single bytes, so that's the most centroids a subspace can have
+max_centroids = 256
+
+#--------------------------------------------------------------------------------------------------------------
+#   Training
+#--------------------------------------------------------------------------------------------------------------
+
+def nearest(data:np.ndarray, centroids:np.ndarray) -> np.ndarray:
+    "Returns the index of the nearest centroid to every row of data."
+    distances = (centroids ** 2).sum(axis=1) - 2 * data @ centroids.T
+    return distances.argmin(axis=1)
+
+def kmeans(data:np.ndarray, clusters:int, iterations:int, rng:np.random.Generator) -> np.ndarray:
+    "Plain Lloyd's k-means. Starts from random rows, and any cluster that empties out is reseeded with another random row."
+    centroids = data[rng.choice(len(data), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        labels = nearest(data, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        counts = np.bincount(labels, minlength=clusters)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        centroids[empty] = data[rng.choice(len(data), empty.sum())]
+    return centroids
+
+def train_codebooks(normalized:np.ndarray, subspaces:int, iterations:int=20, sample:int=20000, seed:int=0) -> np.ndarray:
+    "Trains one codebook per subspace on (a sample of) the unit vectors. Returns float32 subspaces x centroids x subspace width."
+    length, dimensions = normalized.shape
+    if dimensions % subspaces != 0:
+        raise ValueError(f"{dimensions} dimensions can't be split evenly into {subspaces} subspaces.")
+
+    rng = np.random.default_rng(seed)
+    training = normalized[rng.choice(length, min(sample, length), replace=False)]
+    clusters = min(max_centroids, len(training))
+    width = dimensions // subspaces
+
+    codebooks = np.zeros((subspaces, clusters, width), dtype=np.float32)
+    for j in range(subspaces):
+        codebooks[j] = kmeans(training[:, j * width:(j + 1) * width], clusters, iterations, rng)
+    return codebooks
+
+def encode(normalized:np.ndarray, codebooks:np.ndarray) -> np.ndarray:
+    "Returns the uint8 codes of every vector, one per subspace."
+    subspaces, _, width = codebooks.shape
+    codes = np.zeros((len(normalized), subspaces), dtype=np.uint8)
+    for j in range(subspaces):
+        codes[:, j] = nearest(normalized[:, j * width:(j + 1) * width], codebooks[j])
+    return codes
+
+def decode(codes:np.ndarray, codebooks:np.ndarray) -> np.ndarray:
+    "Rebuilds approximate vectors from their codes."
+    subspaces = codebooks.shape[0]
+    return np.concatenate([codebooks[j][codes[..., j]] for j in range(subspaces)], axis=-1)
+
+#--------------------------------------------------------------------------------------------------------------
+#   Querying
+#--------------------------------------------------------------------------------------------------------------
+
+def lookup_table(query:np.ndarray, codebooks:np.ndarray) -> np.ndarray:
+    "Returns the subspaces x centroids table of the query's dot product with every centroid."
+    subspaces, _, width = codebooks.shape
+    return np.einsum('jcw,jw->jc', codebooks, query.reshape(subspaces, width))
+
+def approximate_similarities(table:np.ndarray, codes:np.ndarray) -> np.ndarray:
+    "Returns every word's approximate simularity by adding up the table entries its codes pick out."
+    return table[np.arange(table.shape[0]), codes].sum(axis=1)
+
+def recall_at_k(normalized:np.ndarray, codes:np.ndarray, codebooks:np.ndarray, k:int, samples:int=500, seed:int=0) -> float:
+    "Returns the share of each sampled word's exact top k neighbours that the quantized search also puts in its top k."
+    length = len(normalized)
+    k = min(k, length - 1)
+    if k <= 0:
+        return 1.0
+
+    rows = np.random.default_rng(seed).choice(length, min(samples, length), replace=False)
+    found = 0
+    for row in rows:
+        exact = normalized @ normalized[row]
+        approximate = approximate_similarities(lookup_table(decode(codes[row], codebooks), codebooks), codes)
+        exact[row] = approximate[row] = -np.inf
+        found += len(np.intersect1d(np.argpartition(-exact, k)[:k], np.argpartition(-approximate, k)[:k]))
+    return found / (len(rows) * k)
+
+def bank_size(words:int, dimensions:int, subspaces:int, string_bytes:int) -> int:
+    "Returns roughly how big a bank would be, without writing it."
+    return header_size + 4 * (words + 1) + string_bytes + 4 * max_centroids * dimensions + words * subspaces + 12
+
+#--------------------------------------------------------------------------------------------------------------
+#   Files
+#--------------------------------------------------------------------------------------------------------------
+
+def write_pq_bank(path:str, words:list, codes:np.ndarray, codebooks:np.ndarray) -> int:
+    "Writes a product quantized bank. words and codes must line up row for row. Returns the size of the file in bytes."
+    order = sorted(range(len(words)), key=lambda i: words[i].encode('utf-8'))
+    words = sort_words(words)
+    codes = np.ascontiguousarray(codes[order], dtype=np.uint8)
+    subspaces, clusters, width = codebooks.shape
+
+    word_offsets, strings = pack_words(words)
+    body = bytearray(header_size)
+    sections = []
+    for section in (little_endian(word_offsets), strings, codebooks.astype('<f4').tobytes(), codes.tobytes()):
+        sections.append(len(body))
+        body.extend(section)
+        pad(body)
+
+    struct.pack_into(header_format, body, 0, magic, version, 0, len(words), subspaces * width, subspaces, clusters, *sections)
+    with open(path, 'wb') as file:
+        file.write(body)
+    return len(body)
+
+class PQBank:
+    "Reads a product quantized bank straight out of a memory map. The codebooks and codes are NumPy views over the map, not copies."
+
+    def __init__(self, path:str):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = struct.unpack_from(header_format, self.map, 0)
+        if header[0] != magic:
+            raise ValueError(f"{path} is not a product quantized bank.")
+        (_, self.version, _, self.word_count, self.dimensions, self.subspaces, self.centroids,
+         self.word_offsets_at, self.strings_at, codebooks_at, codes_at) = header
+
+        width = self.dimensions // self.subspaces
+        self.codebooks = np.frombuffer(self.map, dtype='<f4', count=self.subspaces * self.centroids * width, offset=codebooks_at).reshape(self.subspaces, self.centroids, width)
+        self.codes = np.frombuffer(self.map, dtype=np.uint8, count=self.word_count * self.subspaces, offset=codes_at).reshape(self.word_count, self.subspaces)
+
+    def close(self):
+        # The views have to go before the map can close
+        del self.codebooks, self.codes
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def word(self, i:int) -> str:
+        "Returns word i."
+        start, stop = struct.unpack_from('<II', self.map, self.word_offsets_at + i * 4)
+        return self.map[self.strings_at + start:self.strings_at + stop].decode('utf-8')
+
+    def get_matches(self, word:str, sim:float=0.5) -> list:
+        "Returns the words whose approximate simularity to word is over sim, most similar first."
+        i = find_word(self.map, self.word_offsets_at, self.strings_at, self.word_count, word)
+        if i < 0:
+            return []
+
+        sims = approximate_similarities(lookup_table(decode(self.codes[i], self.codebooks), self.codebooks), self.codes)
+        sims[i] = -np.inf
+        matches = np.nonzero(sims > float(sim))[0]
+        return [self.word(other) for other in matches[np.argsort(-sims[matches], kind='stable')].tolist()]
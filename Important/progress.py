@@ -0,0 +1,176 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import json
+import re
+import time
+
+from Important.simplify import clear_line, return_loading_string, white
+
+#--------------------------------------------------------------------------------------------------------------
+#   Progress
+#
+#   Stages report how far along they are to a Progress, which hands that on to a sink: a loading bar on the
+#   terminal, a JSON lines log, or nothing at all. Updates are rate limited by time rather than iteration count,
+#   so a stage can report on every item and the sink still only hears about it every interval seconds.
+#   Each stage also keeps counters (rows written, commits, cache hits...) which the sink gets when the stage ends.
+#--------------------------------------------------------------------------------------------------------------
+
+# Seconds between updates reaching the sink.
+interval = 0.1
+
+ansi_pattern = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+
+#--------------------------------------------------------------------------------------------------------------
+#   Sinks
+#--------------------------------------------------------------------------------------------------------------
+
+class NullSink:
+    "Drops everything. Stages running against it only pay for a counter increment."
+    live = False
+
+    def update(self, stage:'Stage'):
+        pass
+
+    def finish(self, stage:'Stage'):
+        pass
+
+    def close(self):
+        pass
+
+class TTYSink(NullSink):
+    "Draws a loading bar on the current line, the same one the stages used to print themselves."
+    live = True
+
+    def update(self, stage:'Stage'):
+        label = stage.label()
+        dots, percent, loading_bar, end = return_loading_string(stage.done, stage.total, seperate_string=True)
+        print(f"{clear_line}{label}{dots}{' ' * (25 - len(label))}{percent} {loading_bar}", end=end)
+
+    def finish(self, stage:'Stage'):
+        # The stage prints its own outcome, this only wipes the bar
+        print(f"{clear_line}{white}", end="\r")
+
+class JSONLinesSink(NullSink):
+    "Appends one JSON object per update and per finished stage to a log file. The file isn't opened until there's something to write."
+    live = True
+
+    def __init__(self, path:str):
+        self.path = path
+        self.file = None
+
+    def write(self, event:str, stage:'Stage', **extra):
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(json.dumps({"event": event, "time": round(time.time(), 3), **stage.summary(), **extra}) + "\n")
+
+    def update(self, stage:'Stage'):
+        self.write("progress", stage, item=ansi_pattern.sub('', str(stage.item)) if stage.item is not None else None)
+
+    def finish(self, stage:'Stage'):
+        self.write("finish", stage)
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+sinks = {'tty': TTYSink, 'json': JSONLinesSink, 'null': NullSink}
+
+#--------------------------------------------------------------------------------------------------------------
+#   Stages
+#--------------------------------------------------------------------------------------------------------------
+
+class Stage:
+    "One run of one stage. Use it as a context manager, and call advance or update as it goes."
+
+    def __init__(self, progress:'Progress', name:str, total:int, title:str):
+        self.progress = progress
+        self.sink = progress.sink
+        self.name = name
+        self.total = total
+        self.title = title
+        self.done = 0
+        self.item = None
+        self.counters = {}
+        self.start = time.perf_counter()
+        self.seconds = 0.0
+        self.next_update = self.start
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.finish()
+
+    def label(self) -> str:
+        "The text shown next to the loading bar, only built when something is actually shown."
+        return self.title.format(self.item) if self.item is not None else self.title.format('').rstrip()
+
+    def report(self):
+        now = time.perf_counter()
+        if now >= self.next_update:
+            self.next_update = now + self.progress.interval
+            self.sink.update(self)
+
+    def advance(self, amount:int=1, item=None):
+        "Moves the stage on by amount, item being what it's working on now."
+        self.done += amount
+        if self.sink.live:
+            self.item = item
+            self.report()
+
+    def update(self, done:int, item=None):
+        "Sets how far along the stage is."
+        self.done = done
+        if self.sink.live:
+            self.item = item
+            self.report()
+
+    def count(self, counter:str, amount:int=1):
+        "Adds to one of the stage's counters."
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def summary(self) -> dict:
+        seconds = (time.perf_counter() - self.start) if not self.seconds else self.seconds
+        return {
+            "stage": self.name,
+            "done": self.done,
+            "total": self.total,
+            "seconds": round(seconds, 4),
+            "per_second": round(self.done / seconds, 1) if seconds > 0 else None,
+            "counters": dict(self.counters),
+        }
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.start
+        self.progress.summaries[self.name] = self.summary()
+        self.sink.finish(self)
+
+class Progress:
+    "Hands out stages and keeps each finished stage's summary, by name."
+
+    def __init__(self, sink=None, interval:float=interval):
+        self.sink = sink or NullSink()
+        self.interval = interval
+        self.summaries = {}
+
+    def stage(self, name:str, total:int=0, title:str="{}") -> Stage:
+        "Starts a stage. title is formatted with the current item when it's shown."
+        return Stage(self, name, total, title)
+
+    def count(self, name:str, counter:str, amount:int=1):
+        "Adds to a counter of something that isn't a single run, like lookups, straight into its summary."
+        summary = self.summaries.setdefault(name, {"stage": name, "counters": {}})
+        summary["counters"][counter] = summary["counters"].get(counter, 0) + amount
+
+    def close(self):
+        self.sink.close()
+
+def make_progress(sink:str='tty', log_path:str='progress.jsonl', interval:float=interval) -> Progress:
+    "Returns a Progress reporting to the named sink: 'tty', 'json' (to log_path) or 'null'."
+    if sink not in sinks:
+        raise ValueError(f"Unknown progress sink {sink!r}, expected one of {', '.join(sinks)}.")
+    return Progress(JSONLinesSink(log_path) if sink == 'json' else sinks[sink](), interval)
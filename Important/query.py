@@ -0,0 +1,236 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import json
+import sqlite3
+from collections import OrderedDict
+
+#--------------------------------------------------------------------------------------------------------------
+#   Settings
+#--------------------------------------------------------------------------------------------------------------
+
+# Rows pulled from SQLite at a time by the streaming queries. Only this many are ever held in memory.
+stream_batch = 1024
+
+#--------------------------------------------------------------------------------------------------------------
+#   Queries
+#--------------------------------------------------------------------------------------------------------------
+
+# Every pair above a threshold that touches a word, from whichever side of the pair it's stored on.
+    # Each half is answered by an index on its own column, which an OR across both columns can't always do.
+
+pair_query = """
+    SELECT word2, sim FROM simularity WHERE word1 = :word AND sim > :threshold
+    UNION ALL
+    SELECT word1, sim FROM simularity WHERE word2 = :word AND sim > :threshold
+    ORDER BY sim DESC
+"""
+
+neighbour_query = "SELECT other, sim FROM neighbours WHERE word = :word AND sim > :threshold ORDER BY rank"
+
+# The same lookups for a whole list of words at once. The words go in as one JSON array, so there's no variable limit.
+
+pair_many_query = """
+    SELECT word1, word2, sim FROM simularity WHERE word1 IN (SELECT value FROM json_each(:words)) AND sim > :threshold
+    UNION ALL
+    SELECT word2, word1, sim FROM simularity WHERE word2 IN (SELECT value FROM json_each(:words)) AND sim > :threshold
+"""
+
+neighbour_many_query = "SELECT word, other, sim FROM neighbours WHERE word IN (SELECT value FROM json_each(:words)) AND sim > :threshold"
+
+# A word's matches with a simularity in [low, high], most similar first. Both halves come out of a (word, sim) index
+    # already in order, so SQLite merges them as they stream instead of sorting everything first.
+
+pair_between_query = """
+    SELECT word2, sim FROM simularity WHERE word1 = :word AND sim BETWEEN :low AND :high
+    UNION ALL
+    SELECT word1, sim FROM simularity WHERE word2 = :word AND sim BETWEEN :low AND :high
+    ORDER BY sim DESC
+"""
+
+neighbour_between_query = "SELECT other, sim FROM neighbours WHERE word = :word AND sim BETWEEN :low AND :high ORDER BY rank"
+
+# Every pair with a simularity in [low, high], most similar first, read backwards off the global sim index.
+    # LIMIT -1 is no limit, which is how the band and top N queries share one statement.
+
+pair_band_query = "SELECT word1, word2, sim FROM simularity WHERE sim BETWEEN :low AND :high ORDER BY sim DESC LIMIT :limit"
+
+# The neighbour table stores a pair once for each word that has the other in its top k. Each pair is only returned
+    # once: from the alphabetically first word if both have it, otherwise from the only word that does.
+
+neighbour_band_query = """
+    SELECT min(word, other), max(word, other), sim FROM neighbours AS pair
+    WHERE sim BETWEEN :low AND :high
+    AND (word < other OR NOT EXISTS (SELECT 1 FROM neighbours WHERE word = pair.other AND other = pair.word))
+    ORDER BY sim DESC LIMIT :limit
+"""
+
+# A word's cluster and its canonical word (the member most similar to the centroid): one read of the word's row, then
+    # one of the cluster index, which keeps each cluster's members in order of how central they are.
+
+canonical_query = """
+    SELECT member.word, self.cluster_id, self.centroid_sim
+    FROM clusters AS self JOIN clusters AS member ON member.cluster_id = self.cluster_id
+    WHERE self.word = :word
+    ORDER BY member.centroid_sim DESC LIMIT 1
+"""
+
+# Every member of a word's cluster, the most central first
+cluster_query = """
+    SELECT member.word, member.centroid_sim
+    FROM clusters AS self JOIN clusters AS member ON member.cluster_id = self.cluster_id
+    WHERE self.word = :word
+    ORDER BY member.centroid_sim DESC
+"""
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def connect_read_only(path:str, check_same_thread:bool=True) -> sqlite3.Connection:
+    "Opens a database file read-only. Fails instead of creating it if it doesn't exist."
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=check_same_thread)
+
+def create_word2_index(cursor:sqlite3.Cursor):
+    '''Creates the index that finds the pairs a word is the second half of, in simularity order.
+    It answers everything the plain word2 index did, so an older database's word2 index is dropped.'''
+    cursor.execute("CREATE INDEX IF NOT EXISTS word2_sim_index ON simularity (word2, sim)")
+    cursor.execute("DROP INDEX IF EXISTS word2_index")
+
+def create_sim_indexes(cursor:sqlite3.Cursor):
+    '''Creates the simularity ordered indexes the band and top N queries read from: per word1, and over every pair.
+    Each one carries the whole row, so a query never has to go back to the table. Together they take more space than the
+    simularity table itself, and are much cheaper to build in one go after a build than to keep up to date during one.'''
+    cursor.execute("CREATE INDEX IF NOT EXISTS word1_sim_index ON simularity (word1, sim)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS sim_index ON simularity (sim)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS neighbour_sim_index ON neighbours (sim, word, other)")
+
+def stream(cursor:sqlite3.Cursor):
+    "Yields a query's rows stream_batch at a time. Stopping early closes the cursor, so the read ends with it."
+    try:
+        while rows := cursor.fetchmany(stream_batch):
+            yield from rows
+    finally:
+        cursor.close()
+
+def detect_storage(db:sqlite3.Connection) -> str:
+    "Returns 'neighbours' if the neighbour table has been built, otherwise 'pairs'."
+    try:
+        return 'neighbours' if db.execute("SELECT 1 FROM neighbours LIMIT 1").fetchone() else 'pairs'
+    except sqlite3.OperationalError:
+        return 'pairs'
+
+#--------------------------------------------------------------------------------------------------------------
+#   Query API
+#--------------------------------------------------------------------------------------------------------------
+
+class LRUCache:
+    "Keeps the size most recently used results, dropping the least recently used one when it's full. Counts hits and misses."
+
+    def __init__(self, size:int):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key:tuple) -> list|None:
+        "Returns a cached result and marks it as recently used, or None if it isn't cached."
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key:tuple, value:list):
+        "Caches a result, dropping the least recently used one if the cache is full."
+        if self.size <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+class SimularityQuery:
+    '''Answers get_matches style lookups over a built simularity database.
+    Keeps one long-lived read-only connection, and the cache_size most recent (word, threshold) results.'''
+
+    def __init__(self, path:str, storage:str|None=None, cache_size:int=4096, check_same_thread:bool=True):
+        self.db = connect_read_only(path, check_same_thread)
+        self.storage = storage or detect_storage(self.db)
+        self.cache = LRUCache(cache_size)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def matches(self, word:str, threshold:float=0.5) -> list[tuple[str, float]]:
+        "Returns [(word, sim), ...] for every word more similar than threshold, most similar first."
+        key = (word, float(threshold))
+        matches = self.cache.get(key)
+        if matches is None:
+            query = neighbour_query if self.storage == 'neighbours' else pair_query
+            matches = self.db.execute(query, {"word": word, "threshold": key[1]}).fetchall()
+            self.cache.put(key, matches)
+        return matches
+
+    def matches_many(self, words:list, threshold:float=0.5) -> dict[str, list[tuple[str, float]]]:
+        "Looks up many words at once. Anything not cached is fetched with a single query. Returns {word: matches}."
+        threshold = float(threshold)
+        results = {}
+        missing = []
+        for word in words:
+            matches = self.cache.get((word, threshold))
+            if matches is None:
+                missing.append(word)
+            else:
+                results[word] = matches
+
+        if missing:
+            fetched = {word: [] for word in missing}
+            query = neighbour_many_query if self.storage == 'neighbours' else pair_many_query
+            for word, other, sim in self.db.execute(query, {"words": json.dumps(missing), "threshold": threshold}):
+                fetched[word].append((other, sim))
+
+            for word, matches in fetched.items():
+                matches.sort(key=lambda match: -match[1])
+                self.cache.put((word, threshold), matches)
+                results[word] = matches
+
+        return results
+
+    def between(self, word:str, low:float, high:float):
+        "Yields (word, sim) for every match of word with a simularity in [low, high], most similar first."
+        query = neighbour_between_query if self.storage == 'neighbours' else pair_between_query
+        yield from stream(self.db.execute(query, {"word": word, "low": float(low), "high": float(high)}))
+
+    def band(self, low:float, high:float, limit:int|None=None):
+        "Yields (word1, word2, sim) for every pair with a simularity in [low, high], most similar first. Never cached."
+        query = neighbour_band_query if self.storage == 'neighbours' else pair_band_query
+        limit = -1 if limit is None else int(limit)
+        yield from stream(self.db.execute(query, {"low": float(low), "high": float(high), "limit": limit}))
+
+    def top_pairs(self, n:int):
+        "Yields the n most similar (word1, word2, sim) pairs overall, most similar first."
+        yield from self.band(-1.0, 1.0, n)
+
+    def canonical(self, word:str) -> tuple[str, int, float]|None:
+        "Returns (canonical word, cluster id, word's simularity to the centroid), or None if the word isn't clustered."
+        try:
+            return self.db.execute(canonical_query, {"word": word}).fetchone()
+        except sqlite3.OperationalError:
+            # Built before there was a clustering stage
+            return None
+
+    def cluster(self, word:str):
+        "Yields (word, centroid_sim) for every member of the word's cluster, the most central first."
+        yield from stream(self.db.execute(cluster_query, {"word": word}))
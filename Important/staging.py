@@ -0,0 +1,44 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import sqlite3
+from typing import Iterable
+
+#--------------------------------------------------------------------------------------------------------------
+#   Settings
+#--------------------------------------------------------------------------------------------------------------
+
+# The temporary table candidate words are loaded into. It only exists for the connection that staged it.
+staging_table = 'staged'
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def stage_words(cursor:sqlite3.Cursor, words:Iterable[str]) -> int:
+    '''Loads candidate words into the staging table, replacing whatever was staged before. Duplicates are dropped.
+    words can be any iterable, including a generator, so nothing has to be built up in memory first. Returns how many were staged.'''
+    cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging_table} (word TEXT PRIMARY KEY) WITHOUT ROWID")
+    cursor.execute(f"DELETE FROM {staging_table}")
+    cursor.executemany(f"INSERT OR IGNORE INTO {staging_table} (word) VALUES (?)", ((word,) for word in words))
+    return cursor.execute(f"SELECT COUNT(*) FROM {staging_table}").fetchone()[0]
+
+def known(cursor:sqlite3.Cursor, table:str) -> list:
+    "Returns the staged words that are already in a table. The table can be in an attached database, e.g. 'token_db.vectors'."
+    cursor.execute(f"SELECT {staging_table}.word FROM {staging_table} JOIN {table} ON {table}.word = {staging_table}.word")
+    return [word for word, in cursor.fetchall()]
+
+def unknown_condition(*tables:str) -> str:
+    "Returns a WHERE condition that keeps only staged words found in none of the tables."
+    return " AND ".join(f"NOT EXISTS (SELECT 1 FROM {table} WHERE {table}.word = {staging_table}.word)" for table in tables)
+
+def unknown(cursor:sqlite3.Cursor, *tables:str) -> list:
+    "Returns the staged words that are in none of the tables."
+    cursor.execute(f"SELECT word FROM {staging_table} WHERE {unknown_condition(*tables)}")
+    return [word for word, in cursor.fetchall()]
+
+def insert_unknown(cursor:sqlite3.Cursor, table:str) -> int:
+    "Copies the staged words that aren't in a table yet into it, all in one statement. Returns how many were added."
+    cursor.execute(f"INSERT OR IGNORE INTO {table} (word) SELECT word FROM {staging_table} WHERE {unknown_condition(table)}")
+    return cursor.rowcount
@@ -0,0 +1,85 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import os
+import sqlite3
+
+#--------------------------------------------------------------------------------------------------------------
+#   Settings
+#--------------------------------------------------------------------------------------------------------------
+
+# Pragmas every connection is opened with, in the order they're applied.
+    # page_size only takes effect on a brand new file, so it has to come before anything else touches it.
+    # WAL with synchronous = NORMAL only syncs at checkpoints instead of on every commit, and readers never block the writer.
+    # A negative cache_size is in KiB rather than pages.
+
+pragmas = {
+    "page_size": 8192,
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -64 * 1024,
+    "mmap_size": 256 * 1024 * 1024,
+}
+
+# user_version the single database is stamped with once the separate files have been copied into it.
+migrated_version = 1
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def open_store(path:str, pragmas:dict=pragmas) -> sqlite3.Connection:
+    "Connects to a database file and applies the tuned pragmas."
+    db = sqlite3.connect(path)
+    for name, value in pragmas.items():
+        db.execute(f"PRAGMA {name} = {value}")
+    return db
+
+def same_file(path1:str, path2:str) -> bool:
+    "Checks if two paths point at the same database file."
+    return os.path.abspath(path1) == os.path.abspath(path2)
+
+def attach(cursor:sqlite3.Cursor, path:str, name:str) -> bool:
+    '''Makes the tables in another database file reachable from this connection under their plain names.
+    Does nothing if the file is already open on it, which is always the case with the single database. Returns whether it attached.'''
+    for _, _, file in cursor.execute("PRAGMA database_list").fetchall():
+        if file and same_file(file, path):
+            return False
+    cursor.execute(f"ATTACH DATABASE ? AS {name}", (path,))
+    return True
+
+def detach(cursor:sqlite3.Cursor, name:str):
+    "Detaches a database attached with attach(). Does nothing if it was never attached."
+    if name in [schema for _, schema, _ in cursor.execute("PRAGMA database_list").fetchall()]:
+        cursor.connection.commit()
+        cursor.execute(f"DETACH DATABASE {name}")
+
+def migrate_stores(db:sqlite3.Connection, paths:list) -> int:
+    '''One-shot copy of every table in the separate database files into db. Tables db doesn't have yet are created from the old schema.
+    Files that don't exist, or are db itself, are skipped. Does nothing once db has been stamped as migrated. Returns how many rows were copied.'''
+    if db.execute("PRAGMA user_version").fetchone()[0] >= migrated_version:
+        return 0
+
+    copied = 0
+    main_file = db.execute("PRAGMA database_list").fetchone()[2]
+    for path in paths:
+        if not os.path.exists(path) or same_file(path, main_file):
+            continue
+
+        db.execute("ATTACH DATABASE ? AS old", (path,))
+        existing = set(name for name, in db.execute("SELECT name FROM main.sqlite_master WHERE type = 'table'"))
+        for name, sql in db.execute("SELECT name, sql FROM old.sqlite_master WHERE type = 'table'").fetchall():
+            if name not in existing:
+                db.execute(sql)
+
+            # By name, since the new table may have gained columns the old one doesn't have
+            columns = ", ".join(column for _, column, *_ in db.execute(f"PRAGMA old.table_info({name})").fetchall())
+            copied += db.execute(f"INSERT OR IGNORE INTO main.{name} ({columns}) SELECT {columns} FROM old.{name}").rowcount
+        db.commit()
+        db.execute("DETACH DATABASE old")
+
+    db.execute(f"PRAGMA user_version = {migrated_version}")
+    db.commit()
+    return copied
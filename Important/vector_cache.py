@@ -0,0 +1,97 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+from Important.manifest import fingerprint
+from Important.vector_store import vector_generation
+from Important.word_store import lemma_vector_query
+
+#--------------------------------------------------------------------------------------------------------------
+#   Vector cache
+#
+#   The lemma vectors, dumped once into a plain .npy matrix (one float32 row per lemma, in word order) with a JSON
+#   index next to it holding the words in row order and a fingerprint of the rows of the vector table they came from.
+#   The matrix is opened with np.load(mmap_mode='r'), so any number of processes read the same pages of the OS page
+#   cache: nothing is copied into them and nothing is deserialized. A cache whose fingerprint doesn't match the
+#   vector table any more is treated as missing, and rebuilt.
+#
+#   The fingerprint covers the vector table's generation id as well as its rows. Rowids alone don't say anything about
+#   the vectors: tokenizing the same words again into a new database (after deleting it, or with another model) gives
+#   the very same rowids. The generation id is random, and changes with every write to the table and with every new table.
+#
+#     lemma_vectors.npy     float32 x (lemmas, width)
+#     lemma_vectors.json    {"fingerprint": "...", "rows": lemmas, "width": width, "words": [...]}
+#--------------------------------------------------------------------------------------------------------------
+
+# Fingerprints the rows a cache is built from: the same rows as the lemma vector query, by word and rowid. Both come
+    # out of the table's word index without reading a single blob.
+lemma_rows_query = lemma_vector_query.replace("vectors.vector", "vectors.rowid", 1)
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def index_path(path:str) -> str:
+    "Returns where the word index of the matrix at path is kept."
+    return os.path.splitext(path)[0] + '.json'
+
+def vector_fingerprint(cursor:sqlite3.Cursor, query:str=lemma_rows_query, parameters:tuple=()) -> str:
+    '''Returns a fingerprint of the vector table rows a cache holds and the table's generation.
+    query must select (word, rowid) in row order.'''
+    return fingerprint(vector_generation(cursor), cursor.execute(query, parameters).fetchall())
+
+def write_vector_cache(path:str, words:list, vectors:np.ndarray, fingerprint:str):
+    '''Writes the matrix and its index. Both are written to a temporary file and moved into place, matrix first,
+    so a reader never sees half a file, and a crash in between leaves an index that doesn't match.'''
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    with open(path + '.tmp', 'wb') as file:
+        np.save(file, vectors)
+    os.replace(path + '.tmp', path)
+
+    index = {"fingerprint": fingerprint, "rows": len(words), "width": int(vectors.shape[1]) if vectors.ndim == 2 else 0, "words": list(words)}
+    with open(index_path(path) + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(index, file)
+    os.replace(index_path(path) + '.tmp', index_path(path))
+
+class VectorCache:
+    '''A memory mapped lemma matrix and its word index. vectors is read-only and shared with every other process that
+    has the same file open. Open one in each worker rather than passing it to them.'''
+
+    def __init__(self, path:str):
+        with open(index_path(path), 'r', encoding='utf-8') as file:
+            index = json.load(file)
+        self.path = path
+        self.fingerprint = index["fingerprint"]
+        self.words = index["words"]
+        self.rows = {word: row for row, word in enumerate(self.words)}
+        self.vectors = np.load(path, mmap_mode='r')
+        if self.vectors.shape != (index["rows"], index["width"]):
+            raise ValueError(f"{path} holds a {self.vectors.shape} matrix, its index expects ({index['rows']}, {index['width']}).")
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word:str):
+        return word in self.rows
+
+    def vector(self, word:str) -> np.ndarray|None:
+        "Returns a word's vector as a view into the mapped file, or None if it isn't cached."
+        row = self.rows.get(word)
+        return None if row is None else self.vectors[row]
+
+def open_vector_cache(path:str, fingerprint:str|None=None) -> VectorCache|None:
+    '''Opens the cache at path. Returns None if there isn't one, it's damaged, or it was built from other rows than
+    fingerprint describes. Leaving fingerprint out skips the check, for workers whose parent has already done it.'''
+    try:
+        cache = VectorCache(path)
+    except (OSError, ValueError, KeyError):
+        return None
+    if fingerprint is not None and cache.fingerprint != fingerprint:
+        return None
+    return cache
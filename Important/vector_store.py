@@ -0,0 +1,102 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import sqlite3
+import uuid
+
+import numpy as np
+
+from Important.matrix import vector_norm
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def create_vector_table(cursor:sqlite3.Cursor):
+    "Creates the vector table, one row per word with its vector stored as raw float32 bytes, and the table holding its generation id."
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vectors (
+        word TEXT PRIMARY KEY,
+        vector BLOB,
+        norm REAL,
+        lemma TEXT,
+        vocab_id INTEGER
+        );
+    """)
+
+    # A fresh table, or one from before generations were kept, gets one now
+    cursor.execute("CREATE TABLE IF NOT EXISTS vector_generation (id INTEGER PRIMARY KEY CHECK (id = 0), generation TEXT)")
+    if vector_generation(cursor) is None:
+        new_vector_generation(cursor)
+
+def new_vector_generation(cursor:sqlite3.Cursor):
+    '''Gives the vector table a new random generation id. Call it with every write to the table, in the same transaction.
+    Anything worked out from the vectors and saved with the old id, like the vector cache, then no longer matches.'''
+    cursor.execute("INSERT OR REPLACE INTO vector_generation (id, generation) VALUES (0, ?)", (uuid.uuid4().hex,))
+
+def vector_generation(cursor:sqlite3.Cursor) -> str|None:
+    "Returns the vector table's current generation id, or None if it has never had one."
+    row = cursor.execute("SELECT generation FROM vector_generation WHERE id = 0").fetchone()
+    return None if row is None else row[0]
+
+def vector_row(word:str, token) -> tuple:
+    "Returns the vectors table row for a spaCy token."
+    vector = np.asarray(token.vector, dtype=np.float32)
+    vocab_id = token.vocab.vectors.find(key=token.orth) if token.has_vector else -1
+    return word, vector.tobytes(), float(vector_norm(vector)), token.lemma_, vocab_id
+
+def vector_from_blob(blob:bytes) -> np.ndarray:
+    "Returns a read-only float32 view straight over a stored vector blob. Nothing is copied."
+    return np.frombuffer(blob, dtype=np.float32)
+
+def load_vector(cursor:sqlite3.Cursor, word:str) -> tuple[np.ndarray, np.float32]|None:
+    "Returns the vector and norm for a single word, or None if it has no vector."
+    row = cursor.execute("SELECT vector, norm FROM vectors WHERE word = ?", (word,)).fetchone()
+    if row is None:
+        return None
+    return vector_from_blob(row[0]), np.float32(row[1])
+
+def load_vectors(cursor:sqlite3.Cursor, query:str="SELECT word, vector FROM vectors ORDER BY word", parameters:tuple=()) -> tuple[list, np.ndarray]:
+    '''Returns the words and a single float32 matrix of their vectors, one row per word.
+    query must select (word, vector) pairs. The blobs are copied once into one buffer, and the matrix is a view over it.'''
+    rows = cursor.execute(query, parameters).fetchall()
+    if len(rows) == 0:
+        return [], np.zeros((0, 0), dtype=np.float32)
+
+    width = len(rows[0][1])
+    buffer = bytearray(width * len(rows))
+    view = memoryview(buffer)
+    for i, (_, blob) in enumerate(rows):
+        view[i * width:(i + 1) * width] = blob
+
+    matrix = np.frombuffer(buffer, dtype=np.float32).reshape(len(rows), width // 4)
+    return [word for word, _ in rows], matrix
+
+def migrate_tokens(db:sqlite3.Connection, load_nlp, batch_size:int=5000) -> int:
+    '''One-shot migration from the old tokens table of serialized Docs to the vectors table.
+    load_nlp returns the spaCy model, and is only called if there's something to migrate.
+    Drops the tokens table and vacuums the database once every row has been moved. Returns how many rows were moved.'''
+    cursor = db.cursor()
+    if cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'tokens'").fetchone() is None:
+        return 0
+
+    # Imported here so the rest of this module never needs spaCy
+    from spacy.tokens import Doc
+
+    nlp = load_nlp()
+    create_vector_table(cursor)
+    read_cursor = db.cursor()
+    read_cursor.execute("SELECT word, token FROM tokens WHERE word NOT IN (SELECT word FROM vectors)")
+
+    migrated = 0
+    while batch := read_cursor.fetchmany(batch_size):
+        rows = [vector_row(word, Doc(nlp.vocab).from_bytes(doc_bytes)[0]) for word, doc_bytes in batch]
+        cursor.executemany("INSERT OR IGNORE INTO vectors (word, vector, norm, lemma, vocab_id) VALUES (?, ?, ?, ?, ?)", rows)
+        migrated += len(rows)
+    new_vector_generation(cursor)
+
+    cursor.execute("DROP TABLE tokens")
+    db.commit()
+    db.execute("VACUUM")
+    return migrated
@@ -0,0 +1,53 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Dependancies
+#--------------------------------------------------------------------------------------------------------------
+
+import sqlite3
+
+#--------------------------------------------------------------------------------------------------------------
+#   Settings
+#--------------------------------------------------------------------------------------------------------------
+
+# Every lemma, answered by the partial index below without touching the rest of the table.
+lemma_query = "SELECT word FROM words WHERE is_lemma = 1 ORDER BY word"
+
+# Every lemma with a vector and its vector, in word order. Needs the token database with the word database attached.
+lemma_vector_query = """
+    SELECT vectors.word, vectors.vector
+    FROM vectors JOIN words ON words.word = vectors.word
+    WHERE words.is_lemma = 1
+    ORDER BY vectors.word
+"""
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def create_word_tables(cursor:sqlite3.Cursor):
+    '''Creates the word and out-of-vocabulary tables. They're nothing but their key, so they're stored as the key itself with no rowid.
+    A word's is_lemma is NULL until get_lemmas has classified it, then 1 if it's its own lemma and 0 if it isn't.'''
+    cursor.execute("CREATE TABLE IF NOT EXISTS words (word TEXT PRIMARY KEY, is_lemma INTEGER) WITHOUT ROWID")
+    cursor.execute("CREATE TABLE IF NOT EXISTS oov (word TEXT PRIMARY KEY) WITHOUT ROWID")
+
+    # Older databases have a words table without the column
+    if 'is_lemma' not in [name for _, name, *_ in cursor.execute("PRAGMA table_info(words)").fetchall()]:
+        cursor.execute("ALTER TABLE words ADD COLUMN is_lemma INTEGER")
+
+    # Only lemmas are ever looked up by the column, so only they're indexed. The index is in word order, so it's also the sort.
+    cursor.execute("CREATE INDEX IF NOT EXISTS lemma_index ON words (word) WHERE is_lemma = 1")
+
+def migrate_lemma_tables(db:sqlite3.Connection) -> int:
+    '''One-shot migration from the old separate lemmas and nonlemmas tables to the is_lemma column.
+    Drops both tables once every word has been moved. Returns how many words were classified.'''
+    tables = set(name for name, in db.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('lemmas', 'nonlemmas')"))
+    if not tables:
+        return 0
+
+    migrated = 0
+    for table, is_lemma in (('lemmas', 1), ('nonlemmas', 0)):
+        if table in tables:
+            db.execute(f"INSERT OR IGNORE INTO words (word) SELECT word FROM {table}")
+            migrated += db.execute(f"UPDATE words SET is_lemma = ? WHERE word IN (SELECT word FROM {table})", (is_lemma,)).rowcount
+            db.execute(f"DROP TABLE {table}")
+    db.commit()
+    return migrated
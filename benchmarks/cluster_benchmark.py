@@ -0,0 +1,116 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Cluster benchmark
+#
+#   Clusters a synthetic vocabulary with known synonym buckets (random centres with noisy members around them) the way
+#   the clustering stage does, straight off a memory mapped vector cache. Reports how long it took, the peak memory
+#   next to the size of the vectors, how pure the buckets came out, and how long a canonical word lookup takes once
+#   they're saved. Purity is the share of lemmas that sit in a bucket whose most common true bucket is their own.
+#
+#   python benchmarks/cluster_benchmark.py [--lemmas 50000] [--width 300] [--cluster-size 20] [--memory-budget 64]
+#--------------------------------------------------------------------------------------------------------------
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from Important.clusters import create_cluster_table, iter_clusters
+from Important.query import SimularityQuery
+from Important.simplify import cyan, white
+from Important.vector_cache import open_vector_cache, write_vector_cache
+from benchmarks.memory import peak_rss_mb
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def write_vocabulary(path:str, lemmas:int, width:int, buckets:int, noise:float, seed:int) -> np.ndarray:
+    "Writes a vector cache of lemmas noisy copies of buckets random centres. Returns each lemma's true bucket."
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((buckets, width), dtype=np.float32)
+    truth = rng.integers(0, buckets, lemmas)
+    vectors = centres[truth] + noise * rng.standard_normal((lemmas, width), dtype=np.float32)
+    write_vector_cache(path, [f"w{number:07d}" for number in range(lemmas)], vectors, 'synthetic')
+    return truth
+
+def purity(labels:np.ndarray, truth:np.ndarray) -> float:
+    "Returns the share of lemmas whose bucket's most common true bucket is their own."
+    order = np.lexsort((truth, labels))
+    labels, truth = labels[order], truth[order]
+
+    # Runs of the same (bucket, true bucket), then the longest run within each bucket
+    starts = np.flatnonzero(np.r_[True, (labels[1:] != labels[:-1]) | (truth[1:] != truth[:-1])])
+    runs = np.diff(np.r_[starts, len(labels)])
+    best = np.zeros(labels.max() + 1, dtype=np.int64)
+    np.maximum.at(best, labels[starts], runs)
+    return best.sum() / len(labels)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cluster a synthetic vocabulary with known synonym buckets and time it.")
+    parser.add_argument('--lemmas', type=int, default=50_000)
+    parser.add_argument('--width', type=int, default=300)
+    parser.add_argument('--cluster-size', type=int, default=20, help="the true bucket size, and the size the stage aims for")
+    parser.add_argument('--noise', type=float, default=0.5, help="how far members stray from their centre, relative to it")
+    parser.add_argument('--passes', type=int, default=3)
+    parser.add_argument('--batch', type=int, default=1024)
+    parser.add_argument('--refinements', type=int, default=2)
+    parser.add_argument('--memory-budget', type=int, default=64, help="in MB")
+    parser.add_argument('--lookups', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+
+    buckets = max(1, round(arguments.lemmas / arguments.cluster_size))
+    steps = max(1, -(-arguments.lemmas * arguments.passes // arguments.batch))
+
+    with tempfile.TemporaryDirectory() as folder:
+        cache_path = os.path.join(folder, 'lemma_vectors.npy')
+
+        # Made in another process, so the whole matrix is never in this one's memory and its peak is the clustering's own
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            truth = pool.submit(write_vocabulary, cache_path, arguments.lemmas, arguments.width, buckets, arguments.noise, arguments.seed).result()
+        cache = open_vector_cache(cache_path)
+        before = peak_rss_mb()
+
+        db_path = os.path.join(folder, 'sim_db.db')
+        db = sqlite3.connect(db_path)
+        create_cluster_table(db.cursor())
+
+        start = time.perf_counter()
+        rows = iter_clusters(cache.words, cache.vectors, buckets, arguments.memory_budget * 1024 * 1024, steps, arguments.batch, arguments.refinements, seed=arguments.seed)
+        db.executemany("INSERT INTO clusters (word, cluster_id, centroid_sim) VALUES (?, ?, ?)", rows)
+        db.commit()
+        seconds = time.perf_counter() - start
+        after = peak_rss_mb()
+
+        labels = np.array([cluster_id for cluster_id, in db.execute("SELECT cluster_id FROM clusters ORDER BY word")])
+        found = len(np.unique(labels))
+        db.close()
+
+        words = random.Random(arguments.seed).sample(cache.words, min(arguments.lookups, len(cache.words)))
+        with SimularityQuery(db_path, storage='pairs', cache_size=0) as query:
+            start = time.perf_counter()
+            for word in words:
+                query.canonical(word)
+            lookup = (time.perf_counter() - start) / len(words)
+        del cache
+
+    size = arguments.lemmas * arguments.width * 4 / 1024 / 1024
+    print(f"Clustered {cyan}{arguments.lemmas:,}{white} lemmas ({size:.0f} MB of vectors) into {cyan}{found:,}{white} of {buckets:,} buckets in {cyan}{seconds:.1f}s{white}")
+    print(f"Purity {cyan}{purity(labels, truth):.3f}{white}, canonical word lookup {cyan}{lookup * 1000 * 1000:.0f}µs{white}")
+    if before is not None:
+        print(f"Peak memory {cyan}{after:.0f} MB{white} ({after - before:+.0f} MB while clustering, with a {arguments.memory_budget} MB block budget)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Ingestion scaling benchmark
+#
+#   Reads the four bundled texts into one word set with 1, 2, 4, ... worker processes and reports the wall time
+#   and speedup of each, checking every run finds the exact same words as a plain sequential read.
+#   Run from anywhere with: python benchmarks/ingest_benchmark.py [piece_size_in_bytes]
+#--------------------------------------------------------------------------------------------------------------
+
+import os
+import sys
+import time
+from pathlib import Path
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from Important.corpus import collect_words, parallel_words
+from Important.simplify import green, red, white
+
+#--------------------------------------------------------------------------------------------------------------
+#   Settings
+#--------------------------------------------------------------------------------------------------------------
+
+titles = ['peterpan', 'callofthewild', 'junglebook', 'frankenstein']
+
+# The bundled texts are small, so they're cut into small pieces to give every worker something to do.
+piece_size = 64 * 1024
+
+# How many times each worker count runs. The best run is reported.
+repeats = 3
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def sequential_words(paths:list) -> set:
+    "Reads every text one after another in this process."
+    words = set()
+    for path in paths:
+        words.update(collect_words(path))
+    return words
+
+def pooled_words(paths:list, workers:int, piece_size:int) -> set:
+    "Reads every text through the process pool and merges the pieces."
+    words = set()
+    for _, _, _, piece_words in parallel_words(paths, workers, piece_size):
+        words.update(piece_words)
+    return words
+
+def best_time(function, *args) -> tuple[float, set]:
+    "Returns the best wall time over the configured number of repeats, and the result of the last run."
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main() -> int:
+    paths = [str(root / f'{title}.txt') for title in titles]
+    size = sum(os.path.getsize(path) for path in paths) / 1024 / 1024
+    piece = int(sys.argv[1]) if len(sys.argv) > 1 else piece_size
+
+    baseline, expected = best_time(sequential_words, paths)
+    print(f"{len(paths)} texts, {size:.1f} MB, {len(expected)} distinct words, {piece // 1024} KB pieces")
+    print(f"{'sequential':<12} {baseline * 1000:8.1f} ms")
+
+    matched = True
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        elapsed, words = best_time(pooled_words, paths, workers, piece)
+        same = words == expected
+        matched = matched and same
+        print(f"{f'{workers} workers':<12} {elapsed * 1000:8.1f} ms  {baseline / elapsed:5.2f}x  {green + '✔' if same else red + '✘ words differ'}{white}")
+        workers *= 2
+
+    return 0 if matched else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,25 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Memory
+#
+#   Peak memory readings shared by the benchmarks. resource only exists on Unix, so elsewhere there's no reading and
+#   the benchmarks leave peak RSS out.
+#--------------------------------------------------------------------------------------------------------------
+
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def peak_rss_mb() -> float|None:
+    "Returns this process's peak resident memory so far in MB, or None where it can't be measured."
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports KB
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
@@ -0,0 +1,77 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Normalizer micro-benchmark
+#
+#   Checks that normalize_word gives the exact same word set as the old chain of str.replace calls on every
+#   bundled text, then times both per token. Run from anywhere with: python benchmarks/normalize_benchmark.py
+#--------------------------------------------------------------------------------------------------------------
+
+import sys
+import timeit
+from pathlib import Path
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from Important.normalize import normalize_word
+from Important.simplify import green, red, white
+
+#--------------------------------------------------------------------------------------------------------------
+#   Settings
+#--------------------------------------------------------------------------------------------------------------
+
+titles = ['peterpan', 'callofthewild', 'junglebook', 'frankenstein']
+
+# How many times each normalizer runs over the tokens. The best run is reported.
+repeats = 5
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def chained_normalize(word:str) -> str:
+    "The original normalization from get_words: a strip plus eleven sequential str.replace calls."
+    word = word.strip('.,!?";.”-“,(—:)—“’‘').lower()
+    word = word.replace('’s', "")
+    word = word.replace('’t', "'t")
+    word = word.replace('’ll', "'ll")
+    word = word.replace('’ve', "'ve")
+    word = word.replace('’re', "'re")
+    word = word.replace('’d', "'d")
+    word = word.replace('’m', "'m")
+    word = word.replace('’em', "'em")
+    word = word.replace('’clock', "'clock")
+    word = word.replace('’cos', "'cos")
+    word = word.replace('’twas', "'twas")
+    return word
+
+def load_tokens(title:str) -> list:
+    "Returns every raw token in a bundled text, split the same way get_words does."
+    return (root / f'{title}.txt').read_text(encoding='utf-8').replace('-', ' ').split()
+
+def time_per_token(normalize, tokens:list) -> float:
+    "Returns the best time per token, in nanoseconds, over the configured number of repeats."
+    best = min(timeit.repeat(lambda: [normalize(token) for token in tokens], number=1, repeat=repeats))
+    return best / len(tokens) * 1e9
+
+def main() -> int:
+    all_tokens = []
+    matched = True
+
+    # Check the word sets match on every text
+    for title in titles:
+        tokens = load_tokens(title)
+        all_tokens.extend(tokens)
+        same = set(map(chained_normalize, tokens)) == set(map(normalize_word, tokens))
+        matched = matched and same
+        print(f"{title + '.txt':<20} {len(tokens):>8} tokens  word sets {'match ' + green + '✔' if same else 'differ ' + red + '✘'}{white}")
+
+    # Time both normalizers over every token at once
+    chained = time_per_token(chained_normalize, all_tokens)
+    compiled = time_per_token(normalize_word, all_tokens)
+    print(f"\nchained str.replace  {chained:7.1f} ns/token")
+    print(f"normalize_word       {compiled:7.1f} ns/token  ({chained / compiled:.2f}x faster)")
+
+    return 0 if matched else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
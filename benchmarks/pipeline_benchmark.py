@@ -0,0 +1,251 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Pipeline benchmark
+#
+#   Runs every stage of the pipeline (get_words, tokenize_words, get_lemmas, the simularity build, cluster_lemmas and
+#   get_matches) against fresh databases in a temporary folder, once for each bundled text and once for all of them together.
+#   Each corpus runs in its own process, so its peak memory is its own. For every stage it records the wall time,
+#   the peak RSS so far, the rows written and the size of the database files, and saves it all as JSON.
+#   Two result files can then be compared to flag anything that got slower or bigger.
+#
+#   python benchmarks/pipeline_benchmark.py run [--out results.json] [--corpora peterpan,union] [--lookups 200]
+#   python benchmarks/pipeline_benchmark.py compare before.json after.json [--tolerance 0.1]
+#--------------------------------------------------------------------------------------------------------------
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from Important.progress import Progress
+from Important.simplify import cyan, green, red, white, yellow
+from benchmarks.memory import peak_rss_mb
+
+#--------------------------------------------------------------------------------------------------------------
+#   Settings
+#--------------------------------------------------------------------------------------------------------------
+
+titles = ['peterpan', 'callofthewild', 'junglebook', 'frankenstein']
+
+# Every text on its own, then all of them in one run
+corpora = {**{title: [title] for title in titles}, 'union': titles}
+
+script = root / 'word_grabbing - Refactor 3.py'
+
+# Timings and sizes can wander this much (as a share) before compare calls it a regression
+tolerance = 0.10
+
+# Tables that only record how a run went, not what it produced. They're left out of the rows written, so a change
+# in how the stages keep track of themselves doesn't look like a change in output.
+bookkeeping_tables = ['manifest', 'corpus_files', 'simularity_lemmas', 'vector_generation']
+
+# Metrics where bigger is worse. Rows written aren't here: a change in those is a change in output, not speed.
+costs = ['seconds', 'peak_rss_mb', 'db_bytes']
+
+#--------------------------------------------------------------------------------------------------------------
+#   Measuring
+#--------------------------------------------------------------------------------------------------------------
+
+def database_files(folder:Path) -> list:
+    "Returns every database file in folder, write-ahead logs included."
+    return sorted(path for path in folder.iterdir() if path.name.endswith(('.db', '.db-wal')))
+
+def count_rows(folder:Path) -> int:
+    "Returns the total number of rows in every output table of every database in folder. Bookkeeping tables aren't counted."
+    total = 0
+    for path in database_files(folder):
+        if not path.name.endswith('.db'):
+            continue
+        db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        for table, in db.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'").fetchall():
+            if table not in bookkeeping_tables:
+                total += db.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        db.close()
+    return total
+
+def measure(results:dict, name:str, folder:Path, stage, *args):
+    "Runs one stage with its output hidden and records how it went. Returns whatever the stage returned."
+    rows = count_rows(folder)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = stage(*args)
+    seconds = time.perf_counter() - start
+    peak = peak_rss_mb()
+
+    results[name] = {
+        'seconds': round(seconds, 4),
+        'peak_rss_mb': None if peak is None else round(peak, 1),
+        'rows_written': count_rows(folder) - rows,
+        'db_bytes': sum(path.stat().st_size for path in database_files(folder)),
+    }
+    return result
+
+#--------------------------------------------------------------------------------------------------------------
+#   Running
+#--------------------------------------------------------------------------------------------------------------
+
+def load_pipeline():
+    "Imports the pipeline script. Its name has spaces in it, so it can't be imported the normal way."
+    spec = importlib.util.spec_from_file_location('word_grabbing', script)
+    module = importlib.util.module_from_spec(spec)
+    with contextlib.redirect_stdout(io.StringIO()):
+        spec.loader.exec_module(module)
+    return module
+
+def run_corpus(titles:list, lookups:int) -> dict:
+    '''Runs the whole pipeline over titles in the current folder, which should be empty. Returns the stage results.
+    The script opens its databases the first time a stage needs them, relative to the current folder, so they're all fresh.'''
+    folder = Path.cwd()
+    pipeline = load_pipeline()
+    stages = {}
+
+    # Report to nowhere, but keep the stages' own counters for the results
+    pipeline.progress = Progress()
+
+    # The texts are read through f'{title}.txt', so a full path without the extension points it at the bundled copy
+    paths = [str(root / title) for title in titles]
+    _, _, all_words = measure(stages, 'get_words', folder, pipeline.get_words, paths)
+    measure(stages, 'tokenize_words', folder, pipeline.tokenize_words, all_words)
+    _, _, all_lemmas = measure(stages, 'get_lemmas', folder, pipeline.get_lemmas)
+
+    # The simularity build the script is configured for
+    if pipeline.simularity_storage == 'neighbours':
+        build = pipeline.build_neighbours
+    else:
+        build = pipeline.check_simularity_matrix if pipeline.simularity_mode == 'matrix' else pipeline.check_simularity
+    measure(stages, 'check_simularity', folder, build, all_words)
+    measure(stages, 'cluster_lemmas', folder, pipeline.cluster_lemmas)
+
+    # A fixed sample of lemmas, so runs look up the same words
+    sample = sorted(all_lemmas)[:lookups]
+    measure(stages, 'get_matches', folder, lambda: [pipeline.get_matches(word, 0.5) for word in sample])
+    stages['get_matches']['lookups'] = len(sample)
+
+    return {
+        'words': len(all_words),
+        'lemmas': len(all_lemmas),
+        'settings': {
+            'simularity_mode': pipeline.simularity_mode,
+            'simularity_storage': pipeline.simularity_storage,
+            'storage_backend': pipeline.storage_backend,
+            'batch_size': pipeline.batch_size,
+            'ingest_workers': pipeline.ingest_workers,
+            'cluster_size': pipeline.cluster_size,
+        },
+        'stages': stages,
+        'counters': {name: summary['counters'] for name, summary in pipeline.progress.summaries.items()},
+    }
+
+def run(corpora_wanted:list, lookups:int, out:str):
+    "Runs every wanted corpus in its own process and temporary folder, then writes the combined results."
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'corpora': {},
+    }
+
+    for name in corpora_wanted:
+        print(f"Benchmarking {cyan}{name}{white}...", end="\r")
+        with tempfile.TemporaryDirectory() as folder:
+            output = Path(folder) / 'result.json'
+            subprocess.run(
+                [sys.executable, __file__, 'corpus', ','.join(corpora[name]), '--lookups', str(lookups), '--out', str(output)],
+                cwd=folder, check=True,
+            )
+            results['corpora'][name] = json.loads(output.read_text())
+
+        total = sum(stage['seconds'] for stage in results['corpora'][name]['stages'].values())
+        print(f"Benchmarked {cyan}{name}{white} in {total:.1f}s {green}✔{white}")
+
+    Path(out).write_text(json.dumps(results, indent=2))
+    print(f"Wrote {out}")
+
+#--------------------------------------------------------------------------------------------------------------
+#   Comparing
+#--------------------------------------------------------------------------------------------------------------
+
+def compare(before_path:str, after_path:str, tolerance:float=tolerance) -> int:
+    "Prints every stage's change between two result files. Returns how many regressions there were."
+    before = json.loads(Path(before_path).read_text())['corpora']
+    after = json.loads(Path(after_path).read_text())['corpora']
+    regressions = 0
+
+    print(f"{'corpus':<15}{'stage':<18}{'metric':<14}{'before':>14}{'after':>14}{'change':>10}")
+    for name in sorted(set(before) & set(after)):
+        for stage in after[name]['stages']:
+            old = before[name]['stages'].get(stage)
+            if old is None:
+                continue
+            new = after[name]['stages'][stage]
+
+            for metric in costs + ['rows_written']:
+                if old.get(metric) is None or new.get(metric) is None:
+                    continue
+                change = (new[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+
+                if metric == 'rows_written':
+                    flag = f"{yellow}output changed" if new[metric] != old[metric] else ""
+                elif change > tolerance:
+                    flag = f"{red}✘ regression"
+                    regressions += 1
+                elif change < -tolerance:
+                    flag = f"{green}✔ improved"
+                else:
+                    flag = ""
+                print(f"{name:<15}{stage:<18}{metric:<14}{old[metric]:>14}{new[metric]:>14}{change:>+10.1%}  {flag}{white}")
+
+    missing = sorted(set(before) ^ set(after))
+    if missing:
+        print(f"\nOnly in one of the files: {', '.join(missing)}")
+    print(f"\n{regressions} regressions over {tolerance:.0%} {red + '✘' if regressions else green + '✔'}{white}")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the pipeline on the bundled texts.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="benchmark the pipeline and save the results")
+    run_parser.add_argument('--out', default='benchmark.json')
+    run_parser.add_argument('--corpora', default=','.join(corpora), help=f"comma separated, from: {', '.join(corpora)}")
+    run_parser.add_argument('--lookups', type=int, default=200, help="how many get_matches lookups to time")
+
+    compare_parser = commands.add_parser('compare', help="compare two result files and flag regressions")
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.add_argument('--tolerance', type=float, default=tolerance)
+
+    # Used by run, once per corpus, inside a fresh temporary folder
+    corpus_parser = commands.add_parser('corpus')
+    corpus_parser.add_argument('titles')
+    corpus_parser.add_argument('--lookups', type=int, default=200)
+    corpus_parser.add_argument('--out', required=True)
+
+    arguments = parser.parse_args()
+    if arguments.command == 'run':
+        wanted = [name.strip() for name in arguments.corpora.split(',') if name.strip()]
+        unknown = [name for name in wanted if name not in corpora]
+        if unknown:
+            parser.error(f"unknown corpora: {', '.join(unknown)}")
+        run(wanted, arguments.lookups, arguments.out)
+        return 0
+    if arguments.command == 'compare':
+        return 1 if compare(arguments.before, arguments.after, arguments.tolerance) else 0
+
+    result = run_corpus(arguments.titles.split(','), arguments.lookups)
+    Path(arguments.out).write_text(json.dumps(result))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
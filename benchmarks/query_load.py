@@ -0,0 +1,112 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Query load generator
+#
+#   Fires bursts of lookups at a built simularity database from many concurrent callers, the way the command parser
+#   does, and reports p50/p99 latency per burst and lookups per second. Runs the same bursts one after another
+#   through the single connection SimularityQuery first, as the baseline. The cache is off by default, so every
+#   lookup actually reaches SQLite.
+#   Run from anywhere with: python benchmarks/query_load.py [--db sim_db.db] [--callers 16] [--burst 200] [--workers 4]
+#--------------------------------------------------------------------------------------------------------------
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from Important.async_query import AsyncSimularityQuery
+from Important.query import SimularityQuery, connect_read_only, detect_storage
+from Important.simplify import cyan, white
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def sample_words(path:str, count:int) -> list:
+    "Returns up to count words that have stored simularities."
+    db = connect_read_only(path)
+    if detect_storage(db) == 'neighbours':
+        query = "SELECT DISTINCT word FROM neighbours LIMIT ?"
+    else:
+        query = "SELECT DISTINCT word1 FROM simularity LIMIT ?"
+    words = [word for word, in db.execute(query, (count,))]
+    db.close()
+    return words
+
+def make_bursts(words:list, bursts:int, burst_size:int, seed:int) -> list:
+    "Returns bursts of random words. Words repeat within and across bursts, like real commands."
+    rng = random.Random(seed)
+    return [[rng.choice(words) for _ in range(burst_size)] for _ in range(bursts)]
+
+def percentile(values:list, share:float) -> float:
+    "Returns the value share of the way through the sorted values."
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+def report(name:str, latencies:list, lookups:int, elapsed:float):
+    print(f"{name:<12}{percentile(latencies, 0.5) * 1000:>10.2f}ms{percentile(latencies, 0.99) * 1000:>10.2f}ms{cyan}{lookups / elapsed:>12.0f}{white}")
+
+def run_serial(path:str, bursts:list, threshold:float, cache_size:int) -> tuple[list, float]:
+    "Runs every burst one after another on one connection. Returns each burst's latency and the total time."
+    latencies = []
+    with SimularityQuery(path, cache_size=cache_size) as query:
+        start = time.perf_counter()
+        for burst in bursts:
+            burst_start = time.perf_counter()
+            for word in burst:
+                query.matches(word, threshold)
+            latencies.append(time.perf_counter() - burst_start)
+        return latencies, time.perf_counter() - start
+
+async def run_async(path:str, bursts:list, threshold:float, cache_size:int, callers:int, workers:int) -> tuple[list, float, int]:
+    "Shares the bursts out between concurrent callers. Returns each burst's latency, the total time and how many lookups were coalesced."
+    latencies = []
+    queue = list(reversed(bursts))
+
+    async with AsyncSimularityQuery(path, workers=workers, cache_size=cache_size) as query:
+        async def caller():
+            while queue:
+                burst = queue.pop()
+                burst_start = time.perf_counter()
+                await query.matches_many(burst, threshold)
+                latencies.append(time.perf_counter() - burst_start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(caller() for _ in range(callers)))
+        return latencies, time.perf_counter() - start, query.coalesced
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test simularity lookups.")
+    parser.add_argument('--db', default='sim_db.db', help="the simularity database (bank.db with the single backend)")
+    parser.add_argument('--callers', type=int, default=16, help="how many callers send bursts at the same time")
+    parser.add_argument('--bursts', type=int, default=200, help="how many bursts are sent in total")
+    parser.add_argument('--burst', type=int, default=200, help="lookups per burst")
+    parser.add_argument('--workers', type=int, default=4, help="reader threads, each with its own connection")
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--cache', type=int, default=0, help="cache size. 0 measures SQLite itself.")
+    parser.add_argument('--vocabulary', type=int, default=5000, help="how many distinct words bursts are drawn from")
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+
+    words = sample_words(arguments.db, arguments.vocabulary)
+    if not words:
+        sys.exit(f"{arguments.db} has no simularities to look up.")
+    bursts = make_bursts(words, arguments.bursts, arguments.burst, arguments.seed)
+    lookups = arguments.bursts * arguments.burst
+
+    print(f"{arguments.bursts} bursts of {arguments.burst} lookups over {len(words)} words, {arguments.callers} callers, {arguments.workers} workers\n")
+    print(f"{'':<12}{'p50':>12}{'p99':>12}{'lookups/s':>12}")
+
+    latencies, elapsed = run_serial(arguments.db, bursts, arguments.threshold, arguments.cache)
+    report("serial", latencies, lookups, elapsed)
+
+    latencies, elapsed, coalesced = asyncio.run(run_async(arguments.db, bursts, arguments.threshold, arguments.cache, arguments.callers, arguments.workers))
+    report("async", latencies, lookups, elapsed)
+    print(f"\n{coalesced} lookups were already in flight and shared a fetch.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Simularity index benchmark
+#
+#   Builds a synthetic simularity table of --rows pairs (10 million by default) with the schema the pipeline creates,
+#   then times the band, top N and per word queries against it twice: first with the table's original indexes (the
+#   word1 key and a plain word2 index), then with the simularity ordered ones. It also times building those indexes
+#   and how much bigger they make the database. Pass --db to keep the table, so the next run can skip building it.
+#
+#   python benchmarks/sim_index_benchmark.py [--rows 10000000] [--db sims.db] [--low 0.7] [--high 0.8] [--top 100]
+#--------------------------------------------------------------------------------------------------------------
+
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from itertools import islice, repeat
+from pathlib import Path
+
+import numpy as np
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from Important.neighbours import create_neighbour_table
+from Important.query import SimularityQuery, create_sim_indexes, create_word2_index, pair_band_query
+from Important.simplify import clear_line, cyan, green, white
+
+#--------------------------------------------------------------------------------------------------------------
+#   Settings
+#--------------------------------------------------------------------------------------------------------------
+
+# Rows inserted per commit while the table is built
+insert_batch = 500_000
+
+# Every index this benchmark can leave behind, dropped before the "before" run
+sim_indexes = ['word1_sim_index', 'word2_sim_index', 'sim_index', 'neighbour_sim_index']
+
+#--------------------------------------------------------------------------------------------------------------
+#   Building the table
+#--------------------------------------------------------------------------------------------------------------
+
+def vocabulary_size(rows:int) -> int:
+    "Returns the fewest words whose pairs add up to at least rows."
+    return math.ceil((1 + math.sqrt(1 + 8 * rows)) / 2)
+
+def build_table(path:str, rows:int, seed:int):
+    '''Fills a new database with rows pairs of a synthetic vocabulary, every word paired with every word after it.
+    Simularities are skewed low like real ones, and rounded the way the pipeline stores them.'''
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode = OFF")
+    db.execute("PRAGMA synchronous = OFF")
+
+    # The same table the pipeline creates, with the indexes it had before the simularity ordered ones
+    db.execute("""
+        CREATE TABLE simularity (
+        word1 TEXT,
+        word2 TEXT,
+        sim REAL,
+        PRIMARY KEY (word1, word2),
+        CHECK (word1 < word2)
+        ) WITHOUT ROWID;
+    """)
+    db.execute("CREATE INDEX word2_index ON simularity (word2)")
+    create_neighbour_table(db.cursor())
+
+    # Zero padded, so the words sort in the same order as their numbers and word1 < word2 always holds
+    length = vocabulary_size(rows)
+    words = [f"w{number:0{len(str(length))}d}" for number in range(length)]
+    rng = np.random.default_rng(seed)
+
+    def pairs():
+        remaining = rows
+        for number, word in enumerate(words):
+            count = min(length - number - 1, remaining)
+            if count <= 0:
+                return
+            remaining -= count
+            sims = np.round(rng.beta(2, 5, count), 5).tolist()
+            yield from zip(repeat(word), words[number + 1:number + 1 + count], sims)
+
+    written = 0
+    generator = pairs()
+    while batch := list(islice(generator, insert_batch)):
+        db.executemany("INSERT INTO simularity (word1, word2, sim) VALUES (?, ?, ?)", batch)
+        db.commit()
+        written += len(batch)
+        print(f"{clear_line}Building the simularity table... {cyan}{written:,}{white} / {rows:,}", end="\r")
+    db.close()
+    print(f"{clear_line}Built a simularity table of {cyan}{rows:,}{white} pairs over {cyan}{length:,}{white} words {green}✔{white}")
+
+def count_rows(path:str) -> int:
+    "Returns how many pairs an existing database holds, or 0 if it has no simularity table."
+    db = sqlite3.connect(path)
+    try:
+        return db.execute("SELECT COUNT(*) FROM simularity").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        db.close()
+
+def reset_indexes(path:str):
+    "Puts a database back to the original indexes, so the before run is what an older database had."
+    db = sqlite3.connect(path)
+    for index in sim_indexes:
+        db.execute(f"DROP INDEX IF EXISTS {index}")
+    db.execute("CREATE INDEX IF NOT EXISTS word2_index ON simularity (word2)")
+    db.commit()
+    db.execute("VACUUM")
+    db.close()
+
+def add_indexes(path:str) -> float:
+    "Builds the simularity ordered indexes the way the pipeline does. Returns how long it took."
+    db = sqlite3.connect(path)
+    start = time.perf_counter()
+    cursor = db.cursor()
+    create_word2_index(cursor)
+    create_sim_indexes(cursor)
+    db.commit()
+    seconds = time.perf_counter() - start
+    db.execute("VACUUM")
+    db.close()
+    return seconds
+
+#--------------------------------------------------------------------------------------------------------------
+#   Timing the queries
+#--------------------------------------------------------------------------------------------------------------
+
+def time_stream(rows) -> tuple[float, float, int]:
+    "Drains a generator of rows. Returns the seconds until the first row, the seconds until the last and the row count."
+    start = time.perf_counter()
+    first = None
+    count = 0
+    for _ in rows:
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    return first or 0.0, time.perf_counter() - start, count
+
+def query_plan(query:SimularityQuery, sql:str, parameters:dict) -> str:
+    "Returns what SQLite does for a query, one step per line."
+    return "; ".join(step[-1] for step in query.db.execute(f"EXPLAIN QUERY PLAN {sql}", parameters))
+
+def run_queries(path:str, words:list, arguments) -> dict:
+    "Times every query against the database as its indexes are now. Returns {name: seconds} plus the band's query plan."
+    results = {}
+    with SimularityQuery(path, storage='pairs', cache_size=0) as query:
+        first, total, count = time_stream(query.band(arguments.low, arguments.high))
+        results[f"band [{arguments.low}, {arguments.high}] first row"] = first
+        results[f"band [{arguments.low}, {arguments.high}] all {count:,} rows"] = total
+        results[f"band first {arguments.top}"] = time_stream(query.band(arguments.low, arguments.high, arguments.top))[1]
+        results[f"top {arguments.top} pairs"] = time_stream(query.top_pairs(arguments.top))[1]
+
+        start = time.perf_counter()
+        for word in words:
+            query.matches(word, arguments.threshold)
+        results[f"matches > {arguments.threshold}, per word"] = (time.perf_counter() - start) / len(words)
+
+        start = time.perf_counter()
+        for word in words:
+            list(query.between(word, arguments.low, arguments.high))
+        results["between, per word"] = (time.perf_counter() - start) / len(words)
+
+        results["plan"] = query_plan(query, pair_band_query, {"low": arguments.low, "high": arguments.high, "limit": -1})
+    return results
+
+def format_seconds(seconds:float) -> str:
+    return f"{seconds * 1000:.2f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+#--------------------------------------------------------------------------------------------------------------
+#   Main
+#--------------------------------------------------------------------------------------------------------------
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time band, top N and per word simularity queries with and without the simularity ordered indexes.")
+    parser.add_argument('--rows', type=int, default=10_000_000, help="how many pairs the synthetic table holds")
+    parser.add_argument('--db', default=None, help="where to keep the table. Reused if it already has --rows pairs. A temporary file by default.")
+    parser.add_argument('--low', type=float, default=0.7)
+    parser.add_argument('--high', type=float, default=0.8)
+    parser.add_argument('--top', type=int, default=100)
+    parser.add_argument('--threshold', type=float, default=0.5, help="the threshold for the per word matches lookups")
+    parser.add_argument('--words', type=int, default=200, help="how many words the per word lookups are timed over")
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+
+    folder = None
+    if arguments.db is None:
+        folder = tempfile.TemporaryDirectory()
+        path = os.path.join(folder.name, 'sims.db')
+    else:
+        path = arguments.db
+
+    try:
+        if count_rows(path) != arguments.rows:
+            if os.path.exists(path):
+                os.remove(path)
+            build_table(path, arguments.rows, arguments.seed)
+        else:
+            print(f"Reusing the {cyan}{arguments.rows:,}{white} pairs in {path}")
+
+        length = vocabulary_size(arguments.rows)
+        words = [f"w{number:0{len(str(length))}d}" for number in random.Random(arguments.seed).sample(range(length), min(arguments.words, length))]
+
+        reset_indexes(path)
+        size_before = os.path.getsize(path)
+        before = run_queries(path, words, arguments)
+
+        index_seconds = add_indexes(path)
+        size_after = os.path.getsize(path)
+        after = run_queries(path, words, arguments)
+    finally:
+        if folder is not None:
+            folder.cleanup()
+
+    print(f"\n{'query':<36}{'before':>12}{'after':>12}{'speedup':>10}")
+    for name in (name for name in before if name != 'plan'):
+        # The band's row count is part of its name, and is the same both times
+        speedup = before[name] / after[name] if after[name] > 0 else float('inf')
+        print(f"{name:<36}{format_seconds(before[name]):>12}{format_seconds(after[name]):>12}{cyan}{speedup:>9.1f}x{white}")
+
+    print(f"\nBand query plan before: {before['plan']}")
+    print(f"Band query plan after:  {after['plan']}")
+    print(f"\nBuilt the indexes in {cyan}{format_seconds(index_seconds)}{white}, the database grew from "
+          f"{cyan}{size_before / 1024 / 1024:.0f} MB{white} to {cyan}{size_after / 1024 / 1024:.0f} MB{white}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
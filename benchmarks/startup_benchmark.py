@@ -0,0 +1,90 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Startup benchmark
+#
+#   Times how long a fresh process takes to import the pipeline script and answer its first lookup, against an
+#   already built bank. The "query" run is what a query-only start costs now. The "with model" run also loads the
+#   spaCy model, which is what every start paid when the model was loaded as the script was imported.
+#   Each run is a new interpreter, so nothing is warm. Run from the folder the databases are in, or pass --folder.
+#
+#   python benchmarks/startup_benchmark.py [--folder .] [--word run] [--repeats 5]
+#--------------------------------------------------------------------------------------------------------------
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from Important.simplify import cyan, green, red, white
+
+script = root / 'word_grabbing - Refactor 3.py'
+
+# Runs in the child process. Times the import, the model (if asked for) and the first lookup separately.
+child = '''
+import importlib.util, json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+spec = importlib.util.spec_from_file_location('word_grabbing', {script!r})
+pipeline = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(pipeline)
+imported = time.perf_counter()
+if {load_model}:
+    pipeline.load_nlp()
+loaded = time.perf_counter()
+matches, _ = pipeline.get_matches({word!r}, 0.5)
+looked_up = time.perf_counter()
+print(json.dumps({{
+    "import": imported - start,
+    "model": loaded - imported,
+    "lookup": looked_up - loaded,
+    "matches": len(matches),
+    "spacy": "spacy" in sys.modules,
+}}))
+'''
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def start_once(folder:str, word:str, load_model:bool) -> dict:
+    "Starts a fresh interpreter, returns its own timings plus the wall time of the whole process."
+    code = child.format(root=str(root), script=str(script), load_model=load_model, word=word)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], cwd=folder, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return {**json.loads(result.stdout.strip().splitlines()[-1]), "wall": wall}
+
+def best_start(folder:str, word:str, load_model:bool, repeats:int) -> dict:
+    "Returns the run with the lowest wall time."
+    return min((start_once(folder, word, load_model) for _ in range(repeats)), key=lambda run: run["wall"])
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time a cold start of a query against an already built bank.")
+    parser.add_argument('--folder', default='.', help="where the built databases are")
+    parser.add_argument('--word', default='run', help="the word the first lookup is for")
+    parser.add_argument('--repeats', type=int, default=5)
+    arguments = parser.parse_args()
+
+    print(f"{'':<12}{'wall':>10}{'import':>10}{'model':>10}{'lookup':>10}  spaCy imported")
+    runs = {}
+    for name, load_model in (("query", False), ("with model", True)):
+        try:
+            run = runs[name] = best_start(arguments.folder, arguments.word, load_model, arguments.repeats)
+        except RuntimeError as error:
+            print(f"{name:<12}{red}✘ {error}{white}")
+            continue
+        spacy = f"{red}yes" if run["spacy"] else f"{green}no"
+        print(f"{name:<12}" + "".join(f"{run[part] * 1000:>8.0f}ms" for part in ("wall", "import", "model", "lookup")) + f"  {spacy}{white}")
+
+    if len(runs) == 2:
+        print(f"\nQuery-only start is {cyan}{runs['with model']['wall'] / runs['query']['wall']:.1f}x{white} faster than loading the model first.")
+    return 0 if "query" in runs and not runs["query"]["spacy"] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Vector cache benchmark
+#
+#   Starts several worker processes that each need every lemma vector, the way a parallel simularity build would,
+#   and compares two ways of getting them there: every worker reading the vectors out of SQLite into its own matrix,
+#   against every worker mapping the same .npy vector cache. Each worker then touches every row once. Reports how long
+#   each worker took to get its vectors, and how much memory all the workers used between them (proportional set size,
+#   so pages shared between workers are only counted once; Linux only).
+#   The vectors are synthetic, in a temporary token database with the same tables the pipeline creates.
+#
+#   python benchmarks/vector_cache_benchmark.py [--lemmas 50000] [--width 300] [--workers 4]
+#--------------------------------------------------------------------------------------------------------------
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from Important.simplify import cyan, green, white
+from Important.vector_cache import open_vector_cache, vector_fingerprint, write_vector_cache
+from Important.vector_store import create_vector_table, load_vectors
+from Important.word_store import create_word_tables, lemma_vector_query
+
+#--------------------------------------------------------------------------------------------------------------
+#   Functions
+#--------------------------------------------------------------------------------------------------------------
+
+def build_database(path:str, lemmas:int, width:int, seed:int):
+    "Fills a token database with random vectors for lemmas words, every one of them a lemma."
+    db = sqlite3.connect(path)
+    cursor = db.cursor()
+    create_word_tables(cursor)
+    create_vector_table(cursor)
+    rng = np.random.default_rng(seed)
+    words = [f"w{number:07d}" for number in range(lemmas)]
+    vectors = rng.standard_normal((lemmas, width), dtype=np.float32)
+    cursor.executemany("INSERT INTO words (word, is_lemma) VALUES (?, 1)", ((word,) for word in words))
+    cursor.executemany(
+        "INSERT INTO vectors (word, vector, norm, lemma, vocab_id) VALUES (?, ?, ?, ?, ?)",
+        ((word, vector.tobytes(), float(np.linalg.norm(vector)), word, row) for row, (word, vector) in enumerate(zip(words, vectors))),
+    )
+    db.commit()
+    db.close()
+
+def proportional_memory_mb() -> float|None:
+    "Returns this process's proportional set size in MB, or None where /proc doesn't have it."
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as file:
+            for line in file:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def worker(method:str, db_path:str, cache_path:str, start, results):
+    "Gets every lemma vector by method, touches every row, then reports its load time and memory once every worker is loaded."
+    begin = time.perf_counter()
+    if method == 'sqlite':
+        db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        words, vectors = load_vectors(db.cursor(), lemma_vector_query)
+        db.close()
+    else:
+        cache = open_vector_cache(cache_path)
+        words, vectors = cache.words, cache.vectors
+    positions = {word: row for row, word in enumerate(words)}
+    checksum = float(np.einsum('ij,ij->', vectors, vectors, dtype=np.float64))
+    seconds = time.perf_counter() - begin
+
+    # Memory is read once every worker holds its vectors, so the shared pages are split between all of them
+    start.wait()
+    results.put((seconds, proportional_memory_mb(), checksum, len(positions)))
+    start.wait()
+
+def run_workers(method:str, db_path:str, cache_path:str, workers:int) -> tuple[list, float|None]:
+    "Runs workers processes at once. Returns each one's load time and their memory use added up."
+    context = multiprocessing.get_context('spawn')
+    start = context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(method, db_path, cache_path, start, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    start.wait()
+    reports = [results.get() for _ in range(workers)]
+    start.wait()
+    for process in processes:
+        process.join()
+
+    memory = [report[1] for report in reports]
+    return [report[0] for report in reports], None if None in memory else sum(memory)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare workers loading lemma vectors from SQLite against mapping the shared vector cache.")
+    parser.add_argument('--lemmas', type=int, default=50_000)
+    parser.add_argument('--width', type=int, default=300, help="the vector width. en_core_web_lg's vectors are 300 wide.")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        db_path = os.path.join(folder, 'token_db.db')
+        cache_path = os.path.join(folder, 'lemma_vectors.npy')
+        build_database(db_path, arguments.lemmas, arguments.width, arguments.seed)
+
+        # Building the cache is what the first simularity build after a change pays, once
+        db = sqlite3.connect(db_path)
+        start = time.perf_counter()
+        words, vectors = load_vectors(db.cursor(), lemma_vector_query)
+        write_vector_cache(cache_path, words, vectors, vector_fingerprint(db.cursor()))
+        build_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        vector_fingerprint(db.cursor())
+        check_seconds = time.perf_counter() - start
+        db.close()
+        del vectors
+
+        size = arguments.lemmas * arguments.width * 4 / 1024 / 1024
+        print(f"{cyan}{arguments.lemmas:,}{white} lemma vectors of width {arguments.width} ({size:.0f} MB), {arguments.workers} workers\n")
+        print(f"{'':<10}{'mean load':>12}{'slowest':>12}{'memory':>12}")
+        for method in ('sqlite', 'mmap'):
+            seconds, memory = run_workers(method, db_path, cache_path, arguments.workers)
+            memory = f"{memory:.0f} MB" if memory is not None else "n/a"
+            print(f"{method:<10}{sum(seconds) / len(seconds) * 1000:>10.1f}ms{max(seconds) * 1000:>10.1f}ms{memory:>12}")
+
+    print(f"\nBuilt the cache in {cyan}{build_seconds * 1000:.0f}ms{white}, checking it's still valid takes {cyan}{check_seconds * 1000:.1f}ms{white} {green}✔{white}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
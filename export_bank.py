@@ -0,0 +1,74 @@
+#-------------------------------------------------
+#   Edge Bank Export
+#
+#   Writes the simularity database out as a compact, memory-mappable bank for tiny devices, then reports how its
+#   size and lookup latency compare to the SQLite version.
+#
+#   python export_bank.py [--db sim_db.db] [--out sim_bank.wsb] [--k 32] [--floor 0.3] [--samples 500]
+#-------------------------------------------------
+
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+from Important.simplify import *
+from Important.edge_bank import EdgeBank, read_neighbours, write_bank
+
+#-------------------------------------------------
+#   Functions
+#-------------------------------------------------
+
+def sqlite_matches(cursor:sqlite3.Cursor, word:str, sim:float) -> list:
+    "The same lookup get_matches does against the simularity table."
+    cursor.execute("SELECT word1, word2, sim FROM simularity WHERE word1 = ? OR word2 = ?", (word, word))
+    return [match[0] if match[0] != word else match[1] for match in cursor.fetchall() if match[2] > sim]
+
+def time_lookups(lookup, words:list, sim:float) -> float:
+    "Returns the average time of one lookup in microseconds."
+    start = time.perf_counter()
+    for word in words:
+        lookup(word, sim)
+    return (time.perf_counter() - start) / len(words) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the simularity database as a memory-mappable bank.")
+    parser.add_argument('--db', default='sim_db.db', help="the simularity database to export (bank.db with the single backend)")
+    parser.add_argument('--out', default='sim_bank.wsb', help="where to write the bank")
+    parser.add_argument('--k', type=int, default=32, help="the most neighbours kept per word")
+    parser.add_argument('--floor', type=float, default=0.3, help="the lowest simularity kept")
+    parser.add_argument('--threshold', type=float, default=0.5, help="the threshold lookups are timed at")
+    parser.add_argument('--samples', type=int, default=500, help="how many words lookups are timed over")
+    arguments = parser.parse_args()
+
+    # Export
+    print(f"{clear_line}Reading neighbours from {arguments.db}...", end="\r")
+    db = sqlite3.connect(arguments.db)
+    neighbours = read_neighbours(db, arguments.k, arguments.floor)
+    size = write_bank(arguments.out, neighbours)
+    print(f"{clear_line}Exported {len(neighbours)} words to {arguments.out} {green}✔{white}")
+
+    # Size report
+    sqlite_size = sum(os.path.getsize(path) for path in (arguments.db, arguments.db + '-wal') if os.path.exists(path))
+    print(f"\n{'':<10}{'size':>12}")
+    print(f"{'SQLite':<10}{sqlite_size / 1024:>10.1f} KB")
+    print(f"{'bank':<10}{size / 1024:>10.1f} KB  ({sqlite_size / max(size, 1):.1f}x smaller)")
+
+    # Latency report, only if there's a pair table to compare against
+    if len(neighbours) == 0 or db.execute("SELECT 1 FROM sqlite_master WHERE name = 'simularity'").fetchone() is None:
+        return
+
+    words = random.Random(0).sample(sorted(neighbours), min(arguments.samples, len(neighbours)))
+    cursor = db.cursor()
+    with EdgeBank(arguments.out) as bank:
+        sqlite_time = time_lookups(lambda word, sim: sqlite_matches(cursor, word, sim), words, arguments.threshold)
+        bank_time = time_lookups(bank.get_matches, words, arguments.threshold)
+
+    print(f"\n{'':<10}{'lookup':>12}   over {len(words)} words at {arguments.threshold}")
+    print(f"{'SQLite':<10}{sqlite_time:>10.1f} µs")
+    print(f"{'bank':<10}{bank_time:>10.1f} µs  ({sqlite_time / max(bank_time, 1e-9):.1f}x faster)")
+    db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#-------------------------------------------------
+#   Product Quantized Export
+#
+#   Compresses the lemma vectors with product quantization so simularity can be worked out on the device itself,
+#   with a bank that grows with the vocabulary instead of with every pair. Reports recall@k against exact cosine
+#   for a sweep of code sizes, so one can be picked for the memory budget, then writes the bank for --m.
+#
+#   python export_pq.py [--m 30] [--sweep 10,20,30,50,60] [--k 10] [--budget 16] [--out sim_bank.wpq]
+#-------------------------------------------------
+
+import argparse
+import sqlite3
+
+import numpy as np
+
+from Important.simplify import *
+from Important.matrix import build_matrix
+from Important.pq import bank_size, encode, recall_at_k, train_codebooks, write_pq_bank
+from Important.storage import attach
+from Important.vector_store import load_vectors
+from Important.word_store import lemma_vector_query
+
+#-------------------------------------------------
+#   Functions
+#-------------------------------------------------
+
+def load_lemma_vectors(word_db_path:str, token_db_path:str) -> tuple[list, np.ndarray]:
+    "Returns every lemma and one matrix of their vectors."
+    cursor = sqlite3.connect(token_db_path).cursor()
+    attach(cursor, word_db_path, 'word_db')
+    return load_vectors(cursor, lemma_vector_query)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the lemma vectors as a product quantized bank.")
+    parser.add_argument('--word-db', default='word_db.db', help="the database with the words table (bank.db with the single backend)")
+    parser.add_argument('--token-db', default='token_db.db', help="the database with the vectors table (bank.db with the single backend)")
+    parser.add_argument('--out', default='sim_bank.wpq', help="where to write the bank")
+    parser.add_argument('--m', type=int, default=30, help="subspaces, i.e. bytes per word, of the bank that gets written")
+    parser.add_argument('--sweep', default='10,20,30,50,60', help="comma separated subspace counts to report on. Empty to skip.")
+    parser.add_argument('--k', type=int, default=10, help="the k in recall@k")
+    parser.add_argument('--samples', type=int, default=500, help="how many words recall is measured over")
+    parser.add_argument('--budget', type=float, default=16, help="the memory budget in MB")
+    arguments = parser.parse_args()
+
+    print(f"{clear_line}Loading lemma vectors...", end="\r")
+    words, vectors = load_lemma_vectors(arguments.word_db, arguments.token_db)
+    if len(words) < 2:
+        print(f"{clear_line}Not enough lemmas to export {red}✘{white}")
+        return
+    normalized, _, _ = build_matrix(vectors)
+    string_bytes = sum(len(word.encode('utf-8')) for word in words)
+
+    # Report recall and size for every code size in the sweep, then for the one being written
+    sweep = [int(m) for m in arguments.sweep.split(',') if m.strip()]
+    if arguments.m not in sweep:
+        sweep.append(arguments.m)
+
+    print(f"{clear_line}{len(words)} lemmas, {normalized.shape[1]} dimensions, {arguments.budget:g} MB budget\n")
+    print(f"{'subspaces':>10}{'bytes/word':>12}{'bank size':>12}{f'recall@{arguments.k}':>12}")
+    chosen = None
+    for m in sweep:
+        if normalized.shape[1] % m != 0:
+            print(f"{m:>10}   {red}doesn't divide {normalized.shape[1]} dimensions{white}")
+            continue
+
+        print(f"{clear_line}{m:>10}   training...", end="\r")
+        codebooks = train_codebooks(normalized, m)
+        codes = encode(normalized, codebooks)
+        recall = recall_at_k(normalized, codes, codebooks, arguments.k, arguments.samples)
+        size = bank_size(len(words), normalized.shape[1], m, string_bytes)
+        fits = f"{green}✔" if size <= arguments.budget * 1024 * 1024 else f"{red}✘"
+        print(f"{clear_line}{m:>10}{m:>12}{size / 1024 / 1024:>10.2f}MB{recall:>12.3f}  {fits}{white}")
+        if m == arguments.m:
+            chosen = codebooks, codes
+
+    if chosen is None:
+        return
+    size = write_pq_bank(arguments.out, words, chosen[1], chosen[0])
+    print(f"\nWrote {arguments.out} ({size / 1024 / 1024:.2f} MB, {arguments.m} bytes per word) {green}✔{white}")
+
+if __name__ == '__main__':
+    main()
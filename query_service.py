@@ -0,0 +1,121 @@
+#-------------------------------------------------
+#   Query Service
+#
+#   Serves simularity lookups from an already built database, without the interactive UI.
+#
+#   JSON lines on stdin/stdout (the default). One request per line, one response per line:
+#     {"word": "run", "threshold": 0.5}        ->  {"word": "run", "matches": [["sprint", 0.71], ...], "ms": 0.08}
+#     {"words": ["run", "walk"], "threshold": 0.5}  ->  {"matches": {"run": [...], "walk": [...]}, "ms": 0.3}
+#     {"word": "run", "between": [0.6, 0.7]}   ->  {"word": "run", "matches": [["jog", 0.69], ...], "ms": 0.1}
+#     {"band": [0.7, 0.8], "limit": 100}       ->  {"pairs": [["cat", "dog", 0.8], ...], "ms": 0.4}
+#     {"top": 100}                             ->  {"pairs": [...], "ms": 0.2}
+#
+#   Local HTTP with --http PORT:
+#     GET /matches?word=run&threshold=0.5
+#     GET /matches?words=run,walk&threshold=0.5
+#     GET /pairs?low=0.7&high=0.8&limit=100
+#     GET /pairs?top=100
+#
+#   python query_service.py [--db sim_db.db] [--cache 4096] [--http 8080]
+#-------------------------------------------------
+
+import argparse
+import json
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from Important.query import SimularityQuery
+
+# Most pairs a band request answers with when it doesn't give a limit. A wide band can be most of the table.
+band_limit = 1000
+
+#-------------------------------------------------
+#   Functions
+#-------------------------------------------------
+
+def answer(query:SimularityQuery, request:dict) -> dict:
+    "Answers one request, timing how long the lookup took."
+    start = time.perf_counter()
+    threshold = float(request.get("threshold", 0.5))
+    if "top" in request:
+        response = {"pairs": list(query.top_pairs(int(request["top"])))}
+    elif "band" in request:
+        low, high = request["band"]
+        response = {"pairs": list(query.band(low, high, int(request.get("limit", band_limit))))}
+    elif "between" in request:
+        low, high = request["between"]
+        response = {"word": request["word"], "matches": list(query.between(request["word"], low, high))}
+    elif "words" in request:
+        response = {"matches": query.matches_many(request["words"], threshold)}
+    else:
+        response = {"word": request["word"], "matches": query.matches(request["word"], threshold)}
+    response["ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return response
+
+def serve_lines(query:SimularityQuery, input=sys.stdin, output=sys.stdout):
+    "Answers JSON line requests until input runs out. A bad request gets an error line instead of stopping the service."
+    for line in input:
+        if not line.strip():
+            continue
+        try:
+            response = answer(query, json.loads(line))
+        except (ValueError, KeyError, TypeError) as error:
+            response = {"error": str(error)}
+        output.write(json.dumps(response) + "\n")
+        output.flush()
+
+def serve_http(query:SimularityQuery, port:int):
+    "Answers GET /matches and /pairs requests on localhost until interrupted."
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            parameters = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if "words" in parameters:
+                parameters["words"] = parameters["words"].split(",")
+
+            try:
+                if url.path == "/pairs" and "top" not in parameters:
+                    parameters["band"] = [parameters.pop("low", -1.0), parameters.pop("high", 1.0)]
+                elif url.path != "/matches" and url.path != "/pairs":
+                    raise KeyError(f"unknown path {url.path}")
+                status, response = 200, answer(query, parameters)
+            except (ValueError, KeyError, TypeError) as error:
+                status, response = 400, {"error": str(error)}
+
+            body = json.dumps(response).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_):
+            # Logging every request would cost more than answering it
+            pass
+
+    server = HTTPServer(("127.0.0.1", port), Handler)
+    print(f"Serving simularity lookups on http://127.0.0.1:{port}/matches", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve simularity lookups as JSON lines or over local HTTP.")
+    parser.add_argument('--db', default='sim_db.db', help="the simularity database (bank.db with the single backend)")
+    parser.add_argument('--cache', type=int, default=4096, help="how many (word, threshold) results to keep cached")
+    parser.add_argument('--http', type=int, default=None, metavar='PORT', help="serve over HTTP on this port instead of stdin/stdout")
+    arguments = parser.parse_args()
+
+    with SimularityQuery(arguments.db, cache_size=arguments.cache) as query:
+        if arguments.http is None:
+            serve_lines(query)
+        else:
+            serve_http(query, arguments.http)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Matrix tests
+#
+#   The matrix modes have to store exactly what the pairwise check would have: every rounded simularity from a tile
+#   must match spaCy's formula worked out one pair at a time. The vectors are heavy tailed, like real ones, with a
+#   zero vector among them.
+#--------------------------------------------------------------------------------------------------------------
+
+import numpy as np
+
+from Important.matrix import iter_new_pairs, iter_upper_triangle, pair_similarity, rounding_tolerance, round_similarities, row_norms, similarity_tile
+
+#--------------------------------------------------------------------------------------------------------------
+#   Helpers
+#--------------------------------------------------------------------------------------------------------------
+
+def sample_vectors(rows:int=400, width:int=300, seed:int=0) -> np.ndarray:
+    "Returns heavy tailed float32 vectors of very different lengths, with one zero vector in the middle."
+    rng = np.random.default_rng(seed)
+    matrix = (rng.standard_t(3, (rows, width)) * rng.lognormal(0, 1, (rows, 1))).astype(np.float32)
+    matrix[rows // 2] = 0
+    return matrix
+
+def exact(matrix:np.ndarray, norms:np.ndarray, rows, cols) -> np.ndarray:
+    "Returns the simularity of every (row, col) pair the way the pairwise check works them out."
+    return np.array([pair_similarity(matrix[row], matrix[col], norms[row], norms[col]) for row, col in zip(rows, cols)])
+
+#--------------------------------------------------------------------------------------------------------------
+#   Tests
+#--------------------------------------------------------------------------------------------------------------
+
+def test_tiles_stay_well_inside_the_rounding_tolerance():
+    matrix = sample_vectors()
+    norms = row_norms(matrix)
+    rows, cols = np.triu_indices(len(matrix), k=1)
+    tile = similarity_tile(matrix, norms, slice(None), slice(None))
+    assert np.abs(tile[rows, cols] - exact(matrix, norms, rows.tolist(), cols.tolist())).max() < rounding_tolerance / 3
+
+def test_upper_triangle_rounds_like_the_pairwise_check():
+    matrix = sample_vectors()
+    norms = row_norms(matrix)
+    seen = 0
+    # A small budget, so the pairs are spread over many tiles
+    for _, rows, cols, sims in iter_upper_triangle(matrix, norms, 64 * 64 * 128):
+        stored = round_similarities(rows, cols, sims, matrix, norms)
+        assert stored == [round(sim, 5) for sim in exact(matrix, norms, rows.tolist(), cols.tolist())]
+        seen += len(stored)
+    assert seen == len(matrix) * (len(matrix) - 1) // 2
+
+def test_new_pairs_round_like_the_pairwise_check():
+    matrix = sample_vectors()
+    norms = row_norms(matrix)
+    new_rows = np.arange(0, len(matrix), 7)
+    pairs = set()
+    for _, rows, cols, sims in iter_new_pairs(matrix, norms, new_rows, 64 * 64 * 128):
+        stored = round_similarities(rows, cols, sims, matrix, norms)
+        assert stored == [round(sim, 5) for sim in exact(matrix, norms, rows.tolist(), cols.tolist())]
+        pairs.update(zip(rows.tolist(), cols.tolist()))
+
+    # Every pair with a new row in it, exactly once
+    new = set(new_rows.tolist())
+    assert pairs == set((row, col) for row in range(len(matrix)) for col in range(row + 1, len(matrix)) if row in new or col in new)
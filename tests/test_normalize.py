@@ -0,0 +1,56 @@
+#--------------------------------------------------------------------------------------------------------------
+#   Normalizer and reader tests
+#
+#   normalize_word has to give the exact same word set as the old chain of str.replace calls on every bundled text,
+#   and the streaming and parallel readers have to find the same words however the text is cut up.
+#--------------------------------------------------------------------------------------------------------------
+
+import io
+from pathlib import Path
+
+import pytest
+
+from benchmarks.normalize_benchmark import chained_normalize, load_tokens, titles
+from Important.corpus import collect_words, parallel_words, read_words, word_ranges
+from Important.normalize import normalize_word
+
+root = Path(__file__).resolve().parent.parent
+
+#--------------------------------------------------------------------------------------------------------------
+#   Tests
+#--------------------------------------------------------------------------------------------------------------
+
+@pytest.mark.parametrize('title', titles)
+def test_normalize_word_matches_the_old_chain(title):
+    tokens = load_tokens(title)
+    assert set(map(normalize_word, tokens)) == set(map(chained_normalize, tokens))
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64])
+def test_words_cut_at_a_chunk_boundary_are_carried_over(chunk_size):
+    # The start of a text is enough: it has hyphens, curly quotes and line breaks in it
+    text = (root / 'peterpan.txt').read_text(encoding='utf-8')[:20_000]
+    assert list(read_words(io.StringIO(text), chunk_size)) == text.replace('-', ' ').split()
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3])
+def test_multibyte_characters_cut_at_a_chunk_boundary_are_decoded(chunk_size):
+    path = str(root / 'peterpan.txt')
+    assert collect_words(path, chunk_size=chunk_size) == set(map(normalize_word, load_tokens('peterpan')))
+
+def test_pieces_are_cut_at_whitespace_and_cover_the_file():
+    path = root / 'peterpan.txt'
+    data = path.read_bytes()
+    ranges = word_ranges(str(path), 1000)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    assert all(stop == next_start for (_, stop), (next_start, _) in zip(ranges, ranges[1:]))
+    assert all(data[stop:stop + 1].isspace() for _, stop in ranges[:-1])
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_parallel_words_with_small_pieces_finds_every_word(workers):
+    paths = [str(root / f'{title}.txt') for title in titles]
+    words = set()
+    pieces = 0
+    for done, total, path, found in parallel_words(paths, workers, 16 * 1024, chunk_size=1024):
+        words |= found
+        pieces += 1
+    assert pieces == total > len(paths)
+    assert words == set(normalize_word(token) for title in titles for token in load_tokens(title))
@@ -2,15 +2,26 @@
 #   Import Libraries
 #-------------------------------------------------
 
-# SQLite3 is used to create and manage the databases
-import sqlite3
+# OS is used to find the size of the text files
+import os
 
-# Spacy is used to tokenize the words. nlp loads the large English model, which is used to tokenize the words.
+# Spacy is used to tokenize the words. nlp is the large English model, which is used to tokenize the words.
 # The large model is used because it has the most vectors available, which increases simularity accuracy.
 # The model is also used to check for OOV words and lemma extraction.
+# Loading it takes seconds and most of a gigabyte, so spaCy isn't even imported until load_nlp() is first called.
 
-import spacy
-nlp = spacy.load("en_core_web_lg")
+nlp = None
+
+def load_nlp():
+    "Imports spaCy and loads the model the first time it's called, then returns the same model every time."
+    global nlp
+    if nlp is None:
+        import spacy
+        nlp = spacy.load("en_core_web_lg")
+    return nlp
+
+# NumPy holds the lemma vectors as one matrix for the vectorized simularity modes.
+import numpy as np
 
 #-------------------------------------------------
 #   Import modules
@@ -19,6 +30,42 @@ nlp = spacy.load("en_core_web_lg")
 # Simplify adds a few little niceties in centralized spot.
 from Important.simplify import *
 
+# Corpus streams words out of the text files without reading them whole.
+from Important.corpus import read_words, distinct_words, parallel_words, word_tasks
+
+# Staging lets the database work out which words are new or known with a few joins instead of giant IN (...) lists.
+from Important.staging import stage_words, known, unknown, insert_unknown
+
+# Matrix holds the blocked, vectorized simularity math.
+from Important.matrix import block_size, row_norms, iter_upper_triangle, iter_new_pairs, round_similarities, pair_similarity
+
+# Vector store keeps each word's raw vector, so nothing has to rebuild a spaCy Doc to read it.
+from Important.vector_store import create_vector_table, new_vector_generation, vector_row, load_vector, load_vectors, migrate_tokens
+
+# Neighbours keeps only the closest few lemmas for each word instead of every pair.
+from Important.neighbours import create_neighbour_table, neighbour_rows
+
+# Word store keeps every word, and whether it's a lemma, in one table.
+from Important.word_store import create_word_tables, migrate_lemma_tables, lemma_query, lemma_vector_query
+
+# Storage opens the databases with tuned pragmas, and lets them share one file and one connection.
+from Important.storage import open_store, attach, detach, migrate_stores
+
+# Synonym buckets, clustered from the lemma vectors
+from Important.clusters import create_cluster_table, iter_clusters
+
+# The lemma vectors as one memory mapped matrix, shared by every process that opens it
+from Important.vector_cache import vector_fingerprint, write_vector_cache, open_vector_cache
+
+# Cached, read-only simularity lookups, and the simularity ordered indexes behind them
+from Important.query import SimularityQuery, create_word2_index, create_sim_indexes
+
+# Progress reports each stage's loading bar and counters to the terminal, a JSON lines log, or nowhere.
+from Important.progress import make_progress
+
+# The manifest records how far each stage got, so a restarted run carries on where it stopped.
+from Important.manifest import create_manifest_table, fingerprint, corpus_fingerprint, is_complete, start_stage, save_checkpoint, complete_stage
+
 #-------------------------------------------------
 #   Settings
 #-------------------------------------------------
@@ -29,296 +76,359 @@ titles = ['peterpan']                                                      #, 'c
 # The size of each chunk of words to be processed at a time.
     # Larger batch size = faster processing, but more memory usage.
     # Smaller batch size = slower processing, but less memory usage.
+    # Every batch is committed as soon as it's written.
 
 batch_size = 5000
 
-#-------------------------------------------------
-#   Word Database
-#-------------------------------------------------
+# The number of characters read from a text file at a time.
+    # The texts are streamed, so this (plus the vocabulary) is all that's held in memory while reading.
 
-# Create/connect to the word database
-word_db = sqlite3.connect('word_db.db')
-word_cursor = word_db.cursor()
+chunk_size = 64 * 1024
 
-# Create the word tables
-word_cursor.execute("CREATE TABLE IF NOT EXISTS words (word TEXT PRIMARY KEY)")
-word_cursor.execute("CREATE TABLE IF NOT EXISTS oov (word TEXT PRIMARY KEY)")
-word_cursor.execute("CREATE TABLE IF NOT EXISTS lemmas (word TEXT PRIMARY KEY)")
-word_cursor.execute("CREATE TABLE IF NOT EXISTS nonlemmas (word TEXT PRIMARY KEY)")
-word_db.commit()
+# The most worker processes the text files are read with. 1 reads them one after another in this process.
+    # More workers = faster reading with several or large texts, but every worker holds its own set of words until they're merged.
+    # There's never more workers than pieces of text, and a single piece (like one text under piece_size) is always read in this process.
 
-#-------------------------------------------------
-#   Token Database
-#-------------------------------------------------
+ingest_workers = os.cpu_count() or 1
+
+# The most bytes of a text file one worker reads. Larger texts are cut into pieces of about this size and shared between workers.
+
+piece_size = 4 * 1024 * 1024
+
+# The number of processes spaCy tokenizes with.
+    # More processes = faster tokenizing on multi-core machines, but each one loads its own copy of the model.
+
+n_process = 1
+
+# Pipeline components that vectors and lemmas don't need. They're skipped while tokenizing.
+unused_pipes = ['parser', 'ner']
+
+# How simularities are computed.
+    # 'pairwise' loads each vector and compares the lemmas one pair at a time.
+    # 'matrix' loads every lemma vector once and compares them all in blocked matrix products.
+
+simularity_mode = 'matrix'
+
+# The most memory (in bytes) a single block of the simularity matrix is allowed to use in 'matrix' mode.
+    # Larger budget = fewer, bigger blocks. Smaller budget = more, smaller blocks.
+
+memory_budget = 256 * 1024 * 1024
+
+# How simularities are stored.
+    # 'pairs' keeps every lemma pair in the simularity table. Disk use grows with lemmas².
+    # 'neighbours' keeps only the top neighbour_count matches per lemma in the neighbours table. Disk use grows with lemmas x neighbour_count.
+
+simularity_storage = 'pairs'
+
+# How many neighbours are kept per lemma, and the lowest simularity worth keeping, in 'neighbours' storage.
+    # Larger count = more matches available at low thresholds, but a bigger database.
+    # Smaller count = a smaller database, but get_matches can only ever return this many words.
+
+neighbour_count = 50
+neighbour_floor = 0.3
+
+# How the lemmas are grouped into synonym buckets after the simularities are built.
+    # cluster_size is about how many lemmas share a bucket. Smaller = tighter buckets of closer synonyms, but more of them.
+    # cluster_passes is how many times over the lemmas mini-batch training goes, cluster_batch lemmas a step. More passes = better buckets, but slower.
+    # cluster_refinements is how many full passes of plain k-means settle the buckets afterwards.
+
+cluster_size = 20
+cluster_passes = 3
+cluster_batch = 1024
+cluster_refinements = 2
+
+# Where the lemma vectors are cached as a memory mapped .npy matrix, with a word index of the same name ending in .json.
+    # Building the simularities maps the matrix straight from here instead of reading every vector out of the token database.
+    # It's rebuilt whenever the lemma vectors change. None turns the cache off.
 
-# Create/connect to the word database
-token_db = sqlite3.connect('token_db.db')
-token_cursor = token_db.cursor()
+vector_cache_path = 'lemma_vectors.npy'
 
-# Create the token table
-token_cursor.execute("CREATE TABLE IF NOT EXISTS tokens (word TEXT PRIMARY KEY, token BLOB)")
-token_cursor.execute("CREATE INDEX IF NOT EXISTS token_index ON tokens (word)")
-token_db.commit()
+# Where the databases are kept.
+    # 'separate' keeps words, tokens and simularities in their own files, each with its own connection.
+    # 'single' keeps every table in bank_path under one connection, so joins between them need no ATTACH. The separate files are copied in on first run.
+    # Either way the stages commit as they go, once per batch or tile, not once per stage. Only the neighbour and cluster tables are rebuilt in one transaction.
+
+storage_backend = 'separate'
+bank_path = 'bank.db'
+
+# Where the stages report their progress and counters.
+    # 'tty' draws loading bars. 'json' appends a JSON line per update and per finished stage to progress_log. 'null' reports nothing, for batch runs.
+
+progress_sink = 'tty'
+progress_log = 'progress.jsonl'
+
+# Skip the pipeline and go straight to looking up simularities in an already built bank.
+    # Nothing but the simularity database is opened, and spaCy is never imported, so it starts almost instantly.
+
+query_only = False
+
+# How many recent (word, threshold) lookups get_matches keeps cached.
+    # Larger cache = more repeat lookups skip the database, but more memory.
+
+cache_size = 4096
+
+word_db_path, token_db_path, sim_db_path = [bank_path] * 3 if storage_backend == 'single' else ['word_db.db', 'token_db.db', 'sim_db.db']
+
+# Nothing reports until a stage runs, so a query-only start or a spawned ingest worker never opens the progress log.
+progress = None
+
+def open_progress():
+    "Creates the progress sink the first time anything reports, then returns the same one every time."
+    global progress
+    if progress is None:
+        progress = make_progress(progress_sink, progress_log)
+    return progress
+
+def close_progress():
+    "Closes the progress sink, if anything opened it."
+    if progress is not None:
+        progress.close()
 
 #-------------------------------------------------
-#   Simularity Database
+#   Databases
 #-------------------------------------------------
 
-# Create/connect to the simularity database
-sim_db = sqlite3.connect('sim_db.db')
-sim_cursor = sim_db.cursor()
-
-# Create the simularity table
-sim_cursor.execute("""
-    CREATE TABLE IF NOT EXISTS simularity (
-    word1 TEXT, 
-    word2 TEXT, 
-    sim REAL, 
-    PRIMARY KEY (word1, word2),
-    CHECK (word1 < word2)
-    );
-""")
-sim_cursor.execute("CREATE INDEX IF NOT EXISTS word1_index ON simularity (word1)")
-sim_cursor.execute("CREATE INDEX IF NOT EXISTS word2_index ON simularity (word2)")
-sim_db.commit()
+# Nothing is opened until a stage needs it, so lookups in an already built bank never pay for it.
+word_db = word_cursor = token_db = token_cursor = sim_db = sim_cursor = None
+
+def open_databases():
+    "Connects to the word, token and simularity databases and creates their tables. Only does anything the first time."
+    global word_db, word_cursor, token_db, token_cursor, sim_db, sim_cursor
+    if word_db is not None:
+        return
+
+    # Create/connect to the word database
+    word_db = open_store(word_db_path)
+    word_cursor = word_db.cursor()
+
+    # Create the word tables. Whether a word is a lemma is kept right next to it. Older separate lemma tables are folded in by build().
+    create_word_tables(word_cursor)
+
+    # Each database keeps the checkpoints of the stages that write to it, so both are committed together
+    create_manifest_table(word_cursor)
+    word_db.commit()
+
+    # Create/connect to the token database. With the single backend it's the same connection as the word database.
+    token_db = word_db if token_db_path == word_db_path else open_store(token_db_path)
+    token_cursor = token_db.cursor()
+
+    # Create the vector table. Older databases stored whole serialized Docs in a tokens table, main() migrates those once.
+    create_vector_table(token_cursor)
+    create_manifest_table(token_cursor)
+    token_db.commit()
+
+    # Create/connect to the simularity database. With the single backend it's the same connection as the word database.
+    sim_db = word_db if sim_db_path == word_db_path else open_store(sim_db_path)
+    sim_cursor = sim_db.cursor()
+
+    # Create the simularity table. Without a rowid the rows are clustered by word1, so that lookup needs no index of its own.
+    sim_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS simularity (
+        word1 TEXT, 
+        word2 TEXT, 
+        sim REAL, 
+        PRIMARY KEY (word1, word2),
+        CHECK (word1 < word2)
+        ) WITHOUT ROWID;
+    """)
+
+    # Pairs are found by their second word through an index that's also in simularity order, so a lookup from that side
+        # comes out already sorted. The other simularity ordered indexes are built after the simularity stage.
+
+    create_word2_index(sim_cursor)
+
+    # Create the table of lemmas that have been compared to every other lemma, and which build (generation) did it.
+        # Any lemma missing from it is new since the last build, so 'matrix' mode only has to compare those.
+
+    sim_cursor.execute("CREATE TABLE IF NOT EXISTS simularity_lemmas (word TEXT PRIMARY KEY, generation INTEGER) WITHOUT ROWID")
+
+    # Create the neighbour table
+    create_neighbour_table(sim_cursor)
+
+    # Create the cluster table, which says which synonym bucket each lemma is in
+    create_cluster_table(sim_cursor)
+    create_manifest_table(sim_cursor)
+    sim_db.commit()
 
 
 # Get all words from the text files
-def get_words(titles:list=titles) -> tuple[list, list, list]:
-    '''Pulls all the words from the specified text files and returns them as a list.'''
+def get_words(titles:list=titles, chunk_size:int=chunk_size, ingest_workers:int=ingest_workers) -> tuple[list, list, list]:
+    '''Streams the words from the specified text files into the database and returns them as a list.
+    Only the distinct words are ever held in memory, so memory grows with the vocabulary rather than the size of the texts.
+    With more than one worker, every text (or piece of a large text) is read in its own process and the words are merged here.'''
 
-    #! TO DO: create a nested batch database save function so I'm not repeating code
+    open_databases()
 
-    # Create a new set to store the words. Sets prevent duplicates.
+    # Initialize the set of every distinct word seen so far
     words = set()
 
-    # Loop through all the text files
-    for title in titles:
-        with open(f'{title}.txt', 'r', encoding='utf-8') as file:
-
-            # Read the text file and split it into words. Replace all hyphens with spaces, as they are often used to connect words.
-            text = file.read()
-            text = text.replace('-', ' ')
-            all_words = text.split()
-            
-            # Loop through all the words in the text file
-            for i, word in enumerate(all_words):
-                if i % 125 == 0:
-                    string, end = return_loading_string(i, len(all_words))
-                    print(f"{clear_line}Caching words in {title}.txt{string}", end=end)
-                
-                # Get rid of deadspace, punctuation, and make the word lowercase to normalize it
-                word = word.strip('.,!?";.”-“,(—:)—“’‘').lower()
-                word = word.replace('’s', "")
-                word = word.replace('’t', "'t")
-                word = word.replace('’ll', "'ll")
-                word = word.replace('’ve', "'ve")
-                word = word.replace('’re', "'re")
-                word = word.replace('’d', "'d")
-                word = word.replace('’m', "'m")
-                word = word.replace('’em', "'em")
-                word = word.replace('’clock', "'clock")
-                word = word.replace('’cos', "'cos")
-                word = word.replace('’twas', "'twas")
-
-                # Add the processed word to the new words set. It being a set takes care of preventing duplicates.
-                words.add(word)
-
-    # Initialize the new words and known words sets, and the batch set
-    new_words = set()
-    known_words = set()
-    batch = set()
-
-    # Convert words to a list so they can be indexed
-    words = list(words)
-
-    for i, word in enumerate(words):
-        # Add the word to the batch
-        batch.add(word)
-
-        # Every batch_size words, add new words to the database. The ternary operators adapt the batch size to the remaining words automatically.
-        if (i % batch_size == 0 if (len(words) - i) > batch_size else i % 25 == 0 if (len(words) - i) > 25 else True) and i != 0:
-            # Grab already known words from the database
-            placeholders = ','.join('?' * len(batch))
-            word_cursor.execute(f"SELECT word FROM words WHERE word IN ({placeholders})", list(batch))
-
-            # Add the known words to the known words set, so they're not added to the database again.
-            for word, in word_cursor.fetchall():
-                known_words.add(word)
-            
-            # Get only the new words by subtracting the known words from the batch
-            words_to_process = batch - known_words
-            new_words.update(words_to_process)
-
-            # Save the new words to the database
-            for i2, word in enumerate(words_to_process):
-                if i2 % 5 == 0:
-                    dots, percent, loading_bar, end = return_loading_string(i + i2, len(words) + len(words_to_process), seperate_string=True)
-                    print(f"{clear_line}Saving {word}{dots}{" " * (15 - len(word))}{percent} {loading_bar}", end=end)
-                word_cursor.execute("INSERT OR IGNORE INTO words (word) VALUES (?)", (word,))
-
-            batch = set()
+    paths = [f'{title}.txt' for title in titles]
+    with open_progress().stage('get_words', title="Caching words in {}") as stage:
+
+        # Read the text files in parallel and merge every worker's words. A single piece isn't worth a pool.
+        if ingest_workers > 1 and len(word_tasks(paths, piece_size)) > 1:
+            for done, total, path, piece_words in parallel_words(paths, ingest_workers, piece_size, chunk_size):
+                stage.total = total
+                stage.update(done, path)
+                words.update(piece_words)
+
+        # Otherwise loop through all the text files in this process, with the bar counting bytes read
+        else:
+            stage.total = sum(os.path.getsize(path) for path in paths)
+            read = 0
+            for path in paths:
+                with open(path, 'r', encoding='utf-8') as file:
+
+                    # Loop through every word in the text file that hasn't been seen yet
+                    for word in distinct_words(read_words(file, chunk_size), words):
+                        stage.update(read + file.buffer.tell(), path)
+                read += os.path.getsize(path)
+
+        # Stage every word, then let the database sort them into new and known words and save the new ones
+        stage_words(word_cursor, words)
+        known_words = known(word_cursor, 'words')
+        new_words = unknown(word_cursor, 'words')
+        insert_unknown(word_cursor, 'words')
+        word_db.commit()
+        stage.count('words', len(words))
+        stage.count('rows_written', len(new_words))
+        stage.count('commits')
 
     print(f"{clear_line}Finished pulling {len(words)} words from {len(titles)} text {'files' if len(titles) > 1 else 'file'} {green}✔{white}" if len(words) > 0 else f"No words could be found {red}✘{white}", end="\n")
-    return list(new_words), list(known_words), words
+    return new_words, known_words, list(words)
 
-def tokenize_words(words:list, batch_size:int=batch_size) -> tuple[list, list, list]:
+def tokenize_words(words:list, batch_size:int=batch_size, n_process:int=n_process) -> tuple[list, list, list]:
 
-    words = words.copy()
     # If there are no new words, return an empty list and print a message.
     if len(words) == 0:
         print(f"{clear_line}No new words found {green}✔{white}", end="\n")
         return [], [], []
 
-    # Check if the words are already known to be out-of-vocabulary
-    placeholders = ','.join('?' * len(words))
-    word_cursor.execute(f"SELECT word FROM oov WHERE word IN ({placeholders})", list(words))
-    oov_words = set(word_cursor.fetchall())
-
-    # Print how many/if any out-of-vocabulary words were found, and remove them from the list of words for processing.
-    print(f"{clear_line}Ignored {len(oov_words)} known out of vocabulary words {green}✔{white}" if len(oov_words) > 0 else f"No cached {purple}OOV{white} words found {red}✘{white}", end="\n")
-    for word in oov_words:
-        words.remove(word[0])
+    open_databases()
 
-    # Check if the words are already tokenized
-    placeholders = ','.join('?' * len(words))
-    token_cursor.execute(f"SELECT word FROM tokens WHERE word IN ({placeholders})", list(words))
-    tokenized_words = token_cursor.fetchall()
-
-    # Print how many/if any already tokenized were found, and remove them from the list of words for processing.
-    print(f"{clear_line}Ignored {len(tokenized_words)} stored tokenized words {green}✔{white}" if len(tokenized_words) > 0 else f"No stored {bright_yellow}tokens{white} found {red}✘{white}", end="\n")
-    for word in tokenized_words:
-        words.remove(word[0])
-    
-    # Initialize the new tokens, tokenized words, and new out-of-vocabulary words sets
-    new_oov = set()
-    batch = set()
-    tokenized_words = set()
-    new_tokens = set()
-
-    # Keep track of if an error was found, which will change the output message.
-    error_found = False
-    for i, word in enumerate(words):
-        batch.add(word)
-        if (i % batch_size == 0 if (len(words) - i) > batch_size else i % 25 == 0 if (len(words) - i) > 25 else True) and i != 0:
-            placeholders = ','.join('?' * len(batch))
-            
-            
-            for word in token_cursor.fetchall():
-                tokenized_words.add(word)
-
-            for i2, word in enumerate(batch):
-                if i2 % 5 == 0:
-                    dots, percent, loading_bar, end = return_loading_string(i + i2, len(words) + len(batch), seperate_string=True)
-                    print(f"{clear_line}Tokenizing {word}{dots}{" " * (15 - len(word))}{percent} {loading_bar}", end=end)
-                if word.isalpha():
-                    doc = nlp(word)
-                    if doc.has_vector:
-                        token_cursor.execute("INSERT OR IGNORE INTO tokens (word, token) VALUES (?, ?)", (word, nlp(word).to_bytes()))
-                        new_tokens.add(word)
-                    else:
-                        if not error_found:
-                            error_found = True
-                            print(f"{red}Warning: {word} has no tokens. Skipped.{white}{clear_line}{down}", end="\r")
-                        else:
-                            print(f"{up}{red}Warning: {word} has no tokens. Skipped.{white}{clear_line}{down}", end="\r")
-                        word_cursor.execute("INSERT OR IGNORE INTO oov (word) VALUES (?)", (word,))
-                        new_oov.add(word)
-            token_db.commit()
-            word_db.commit()
-
-            batch = set()
+    # Words are tokenized in order, so a checkpoint from an interrupted run over the same words marks everything up to it as done
+    checkpoint = start_stage(token_cursor, 'tokenize_words', fingerprint(sorted(words)), {'batch_size': batch_size})
+    token_db.commit()
+    if checkpoint is not None:
+        words = [word for word in words if word > checkpoint]
+        print(f"{clear_line}Resuming tokenizing after {checkpoint} {green}✔{white}", end="\n")
 
-    # Print the outcome. 
-    if not error_found:
-        print(f"{clear_line}Finished tokenizing {len(words)} words {green}✔{white}" if len(words) > 0 else f"{up}{clear_line}All words were tokenized {green}✔{white}", end="\n")     
-    else:
-        print(f"{up}{clear_line}{up}{clear_line}{up}{clear_line}Saved {len(new_oov)} new out of vocabulary words into the database {green}✔{white}{down}")
-        print(f"{up}{clear_line}Finished tokenizing {len(words)} words {green}✔{white}{down}{clear_line}{up}" if len(words) > 0 else f"{up}{clear_line}All words were tokenized {green}✔{white}{down}{clear_line}{up}", end="\n")
-        print(f"{down}{clear_line}{up}", end="\r")
+    # Stage the words so the database can find the known out-of-vocabulary and already tokenized ones itself
+    attach(word_cursor, token_db_path, 'token_db')
+    stage_words(word_cursor, words)
 
-    return list(new_tokens), list(tokenized_words), list(new_oov)
+    # Print how many/if any out-of-vocabulary words were found
+    oov_words = known(word_cursor, 'oov')
+    print(f"{clear_line}Ignored {len(oov_words)} known out of vocabulary words {green}✔{white}" if len(oov_words) > 0 else f"No cached {purple}OOV{white} words found {red}✘{white}", end="\n")
 
-def get_lemmas(words:list) -> list:
+    # Print how many/if any already tokenized were found
+    tokenized_words = known(word_cursor, 'vectors')
+    print(f"{clear_line}Ignored {len(tokenized_words)} stored tokenized words {green}✔{white}" if len(tokenized_words) > 0 else f"No stored {bright_yellow}tokens{white} found {red}✘{white}", end="\n")
 
-    # Create placeholders for both the lemmas and nonlemma queries
-    placeholders = ','.join('?' * len(words))
+    # Only the words that are neither are left for processing
+    words = unknown(word_cursor, 'oov', 'vectors')
+    word_db.commit()
+    detach(word_cursor, 'token_db')
 
-    # Get all the lemmas
-    word_cursor.execute(f"SELECT word FROM lemmas WHERE word IN ({placeholders})", list(words))
-    known_lemmas = set(word_cursor.fetchall()) if word_cursor.fetchall() != [] else set(word_cursor.execute("SELECT word FROM lemmas").fetchall())
+    # Initialize the new tokens and new out-of-vocabulary words sets
+    new_oov = set()
+    new_tokens = set()
 
-    # Get all the nonlemmas
-    word_cursor.execute(f"SELECT word FROM nonlemmas WHERE word IN ({placeholders})", list(words))
-    nonlemmas = set(word_cursor.fetchall())
+    # Rows waiting to be written, one list per table
+    vector_batch = []
+    oov_batch = []
 
-    # Exclude words that have already been processed
-    excluded = set(word[0] for word in known_lemmas | nonlemmas)
-    new_words = list(set(words) - excluded)
+    # Only alphabetic words are worth running through the model
+    words = sorted(word for word in words if word.isalpha())
 
-    print(f"{clear_line}Ignored {len(excluded)} words with lemma data {green}✔{white}" if len(excluded) > 0 else f"No cached lemma data found {red}✘{white}", end="\n")
+    with open_progress().stage('tokenize_words', total=len(words), title="Tokenizing {}") as stage:
 
-    # Get the tokens for all the new words
-    placeholders = ','.join('?' * len(new_words))
-    token_cursor.execute(f"SELECT word, token FROM tokens WHERE word IN ({placeholders})", list(new_words))
-    tokens = token_cursor.fetchall()
-    
-    # Initialize the lemmas and batch sets
-    new_lemmas = set()
-    batch = set()
-    
-    # Get the lemmas for all tokenized words
-    for i, (word, doc_bytes) in enumerate(tokens):
-
-        # Add the word to the batch
-        batch.add((word, doc_bytes))
-        
-        # Every batch_size words, add new lemmas to the database. The ternary operators adapt the batch size to the remaining words automatically.
-        if (i % batch_size == 0 if (len(tokens) - i) > batch_size else i % 25 == 0 if (len(tokens) - i) > 25 else True) and i != 0:
-            
-            # Parse the batch's word/doc byte pairs
-            for i2, (word, doc_bytes) in enumerate(batch):
-
-                # Every 5 words, update the loading string
-                if i2 % 5 == 0:
-                    dots, percent, loading_bar, end = return_loading_string(i + i2, len(tokens) + len(batch), seperate_string=True)
-                    print(f"{clear_line}Saving lemma for {word}{dots}{" " * (15 - len(word))}{percent} {loading_bar}", end=end)
-                
-                if word.isalpha():
-                    # Reassemble the doc/token
-                    doc = spacy.tokens.Doc(nlp.vocab).from_bytes(doc_bytes)
-                    token = doc[0]
-
-                    lemma = token.lemma_
-                    # Check if the word is a lemma
-                    if token.lemma_ == word:
-
-                        # If the word is a lemma, add it to the lemmas set, but only if it's not already in there
-                        if word not in known_lemmas:
-                            new_lemmas.add(word)
-                            word_cursor.execute("INSERT OR IGNORE INTO lemmas (word) VALUES (?)", (lemma,))
-
-                    # If the word is not a lemma, add it to the nonlemmas so it's not checked again
-                    else:
-                        word_cursor.execute("INSERT OR IGNORE INTO nonlemmas (word) VALUES (?)", (word,))
-            
-            # Commit the changes to the database
+        def save_batch(last_word:str|None):
+            '''Writes the waiting rows in one transaction per database.
+            The vectors and the checkpoint are committed last and together, so the checkpoint never gets ahead of what's saved.'''
+            word_cursor.executemany("INSERT OR IGNORE INTO oov (word) VALUES (?)", oov_batch)
             word_db.commit()
-            batch = set()
-    
-    # Save all cached  to the database
-    for i, lemma in enumerate(new_lemmas):
-        if i % 5 == 0:
-            dots, percent, loading_bar, end = return_loading_string(i, len(new_lemmas), seperate_string=True)
-            print(f"{clear_line}Saving lemma for {lemma}{dots}{" " * (15 - len(lemma))}{percent} {loading_bar}", end=end)
+            token_cursor.executemany("INSERT OR IGNORE INTO vectors (word, vector, norm, lemma, vocab_id) VALUES (?, ?, ?, ?, ?)", vector_batch)
+            if len(vector_batch) > 0:
+                new_vector_generation(token_cursor)
+            if last_word is not None:
+                save_checkpoint(token_cursor, 'tokenize_words', last_word, stage.done)
+            token_db.commit()
+            stage.count('rows_written', len(vector_batch) + len(oov_batch))
+            stage.count('commits', 2)
+            vector_batch.clear()
+            oov_batch.clear()
+
+        # Stream the words through the model a batch at a time, skipping the components vectors and lemmas don't need
+        docs = load_nlp().pipe(words, batch_size=batch_size, n_process=n_process, disable=unused_pipes)
+        for word, doc in zip(words, docs):
+            stage.advance(1, word)
+
+            if doc.has_vector:
+                vector_batch.append(vector_row(word, doc[0]))
+                new_tokens.add(word)
+            else:
+                oov_batch.append((word,))
+                new_oov.add(word)
+
+            # Every batch_size words, write the batch to the databases
+            if len(vector_batch) + len(oov_batch) >= batch_size:
+                save_batch(word)
+
+        # Write whatever is left over, and mark the stage done
+        complete_stage(token_cursor, 'tokenize_words', stage.done)
+        save_batch(None)
+        stage.count('oov', len(new_oov))
+
+    # Work out the throughput, so worker counts can be sized against it
+    elapsed = open_progress().summaries['tokenize_words']['seconds']
+    rate = f"{int(len(words) / elapsed)} words/sec" if elapsed > 0 else "instantly"
+
+    # Print the outcome.
+    if len(new_oov) > 0:
+        print(f"{clear_line}Saved {len(new_oov)} new out of vocabulary words into the database {green}✔{white}", end="\n")
+    print(f"{clear_line}Finished tokenizing {len(words)} words at {rate} {green}✔{white}" if len(words) > 0 else f"{clear_line}All words were tokenized {green}✔{white}", end="\n")
+
+    return list(new_tokens), tokenized_words, list(new_oov)
+
+def get_lemmas() -> list:
+    '''Classifies every tokenized word that isn't classified yet as a lemma or not. Returns the new lemmas, the ones that
+    were already known, and both together. Every unclassified word is picked up, not just this run's new ones, so a run
+    that stopped between tokenizing and here has its words classified by the next one.'''
+    open_databases()
+
+    # The database finds the words that already have lemma data itself
+    attach(word_cursor, token_db_path, 'token_db')
+    known_lemmas = [word for word, in word_cursor.execute(lemma_query).fetchall()]
+    excluded = word_cursor.execute("SELECT COUNT(*) FROM words WHERE is_lemma IS NOT NULL").fetchone()[0]
+
+    print(f"{clear_line}Ignored {excluded} words with lemma data {green}✔{white}" if excluded > 0 else f"No cached lemma data found {red}✘{white}", end="\n")
+
+    # Every remaining tokenized word is a lemma if its lemma (worked out while tokenizing) is itself, and a nonlemma otherwise.
+        # They're all classified by one statement.
+
+    print(f"{clear_line}Saving lemmas...", end="\r")
+    word_cursor.execute("""
+        SELECT words.word FROM words JOIN vectors ON vectors.word = words.word
+        WHERE words.is_lemma IS NULL AND vectors.lemma = words.word
+        ORDER BY words.word
+    """)
+    new_lemmas = [word for word, in word_cursor.fetchall()]
+    word_cursor.execute("""
+        UPDATE words SET is_lemma = (SELECT vectors.lemma = words.word FROM vectors WHERE vectors.word = words.word)
+        WHERE is_lemma IS NULL
+        AND word IN (SELECT word FROM vectors)
+    """)
     word_db.commit()
+    detach(word_cursor, 'token_db')
 
     print(f"{up}{clear_line}Finished getting lemmas for {len(new_lemmas)} words {green}✔{white}" if len(new_lemmas) > 0 else f"{up}{clear_line}No new lemmas were found {green}✔{white}", end="\n")
-    return list(new_lemmas), list(known_lemmas), list(known_lemmas) + list(new_lemmas)
+    return new_lemmas, known_lemmas, known_lemmas + new_lemmas
 
 # Here goes the one I'm terrified of the most... Simularity checking. Here goes nothing.
 def check_simularity(words:list):
-    sim_cursor.execute("ATTACH DATABASE 'word_db.db' AS word_db")
+    open_databases()
+    attach(sim_cursor, word_db_path, 'word_db')
     # Get all the lemmas
     placeholders = ','.join('?' * len(words))
 
@@ -337,38 +447,43 @@ def check_simularity(words:list):
     """)
     unique_word_count = sim_cursor.fetchone()[0]
 
-    lemmas = word_cursor.execute("SELECT * FROM lemmas").fetchall()
+    lemmas = word_cursor.execute(lemma_query).fetchall()
     lemmas = [lemma[0] for lemma in lemmas]
 
-    # Get every word in the simularity database. Used to check if there's any stragglers with no simularity data, which is impossible once the first word is fully done.
-    sim_cursor.execute("""
-        SELECT word
-        FROM (
-            SELECT word1 AS word FROM simularity
-            UNION ALL
-            SELECT word2 AS word FROM simularity
-        ) subquery
-        GROUP BY word
-        HAVING COUNT(*) < (((SELECT COUNT(*) FROM word_db.lemmas) - 1) / 2);
-    """)
+    # A run over the same lemmas that was interrupted has done every lemma up to its checkpoint, so that's all it takes to resume
+    checkpoint = start_stage(sim_cursor, 'check_simularity', fingerprint(sorted(lemmas)), {'simularity_mode': 'pairwise'})
+    sim_db.commit()
+    if checkpoint is not None:
+        not_done = [lemma for lemma in sorted(lemmas) if lemma > checkpoint]
 
-    not_done = set([word[0] for word in sim_cursor.fetchall()]) if unique_word_count != (0 or None) else set(lemmas)
-    not_done = sorted(list(not_done))
+    # Otherwise get every word in the simularity database. Used to check if there's any stragglers with no simularity data, which is impossible once the first word is fully done.
+    else:
+        sim_cursor.execute("""
+            SELECT word
+            FROM (
+                SELECT word1 AS word FROM simularity
+                UNION ALL
+                SELECT word2 AS word FROM simularity
+            ) subquery
+            GROUP BY word
+            HAVING COUNT(*) < (((SELECT COUNT(*) FROM words WHERE is_lemma = 1) - 1) / 2);
+        """)
+
+        not_done = set([word[0] for word in sim_cursor.fetchall()]) if unique_word_count != (0 or None) else set(lemmas)
+        not_done = sorted(list(not_done))
 
     new_similarities = 0
+    stage = open_progress().stage('check_simularity', total=len(not_done), title="Checking simularities for {}")
     # Compare all the lemmas to each other
     for i, word in enumerate(not_done):
-        dots, percent, loading_bar, end = return_loading_string(i, (len(lemmas) / 2), seperate_string=True)
-        print(f"{clear_line}{up}Checking simularities for {word}{dots}{" " * (15 - len(word))}{percent} {loading_bar}{down}", end=end)
+        stage.advance(1, word)
 
-        # Reassemble the doc/token
-        doc_bytes = token_cursor.execute("SELECT token FROM tokens WHERE word = ?", (word,)).fetchone()[0]
-        doc = spacy.tokens.Doc(nlp.vocab).from_bytes(doc_bytes)
-        token = doc[0]
+        # Load the vector
+        vector, norm = load_vector(token_cursor, word)
         needs_to_match = set(word[0] for word in sim_cursor.execute("""
             SELECT word 
-            FROM word_db.lemmas
-            WHERE word NOT IN (
+            FROM words
+            WHERE is_lemma = 1 AND word NOT IN (
                 SELECT word2 FROM simularity WHERE word1 = ? 
                 UNION 
                 SELECT word1 FROM simularity WHERE word2 = ?
@@ -378,9 +493,7 @@ def check_simularity(words:list):
 
         # Compare the token to all other tokens
         for i2, word2 in tuple(enumerate(needs_to_match))[i+1:]:
-            if i2 % 10 == 0:
-                dots, percent, loading_bar, end = return_loading_string(i2, len(needs_to_match), seperate_string=True)
-                print(f"{clear_line}Checking simularity with {word2}{dots}{" " * (16 - len(word2))}{percent} {loading_bar}", end=end)
+            stage.count('pairs_checked')
 
             # Check if the simularity has already been calculated, and if not, calculate it.
             pair = [word, word2]
@@ -388,76 +501,333 @@ def check_simularity(words:list):
             key = tuple(pair)
             sim_cursor.execute("SELECT sim FROM simularity WHERE word1 = ? AND word2 = ?", (key[0], key[1]))
             if not sim_cursor.fetchone():
-                # Reassemble the doc/token
-                doc_bytes2 = token_cursor.execute("SELECT token FROM tokens WHERE word = ?", (word2,)).fetchone()[0]
-                doc2 = spacy.tokens.Doc(nlp.vocab).from_bytes(doc_bytes2)
-                token2 = doc2[0]
+                # Load the other vector
+                vector2, norm2 = load_vector(token_cursor, word2)
 
                 # Calculate the simularity
-                sim = round(token.similarity(token2), 5)
+                sim = round(pair_similarity(vector, vector2, norm, norm2), 5)
                 new_similarities += 1
 
                 # Save the simularity to the database
                 sim_cursor.execute("INSERT OR IGNORE INTO simularity (word1, word2, sim) VALUES (?, ?, ?)", (key[0], key[1], sim))
                 new_similarities += 1
+                stage.count('rows_written')
 
             if i2 % batch_size == 0:
                 sim_db.commit()
+                stage.count('commits')
 
+        # The word is only done once all its pairs are saved, so its checkpoint goes in the same commit
+        save_checkpoint(sim_cursor, 'check_simularity', word, i + 1)
         sim_db.commit()
+        stage.count('commits')
     
+    complete_stage(sim_cursor, 'check_simularity', len(not_done))
+    sim_db.commit()
+    stage.finish()
+    detach(sim_cursor, 'word_db')
     return new_similarities
 
+def load_lemma_vectors(vector_cache_path:str|None=vector_cache_path) -> tuple[list, np.ndarray]:
+    '''Returns every lemma and one matrix of their vectors. Sorting them means row i < row j always gives word1 < word2.
+    With a vector cache, the matrix is mapped straight from it, and only rebuilt when the lemma vectors have changed.'''
+    print(f"{clear_line}Loading lemma vectors...", end="\r")
+    open_databases()
+    attach(token_cursor, word_db_path, 'word_db')
+
+    # The fingerprint only reads the vector table's word index, so checking the cache costs next to nothing
+    if vector_cache_path:
+        run = vector_fingerprint(token_cursor)
+        cache = open_vector_cache(vector_cache_path, run)
+        if cache is not None:
+            detach(token_cursor, 'word_db')
+            open_progress().count('load_lemma_vectors', 'cache_hits')
+            return cache.words, cache.vectors
+
+    words, vectors = load_vectors(token_cursor, lemma_vector_query)
+    detach(token_cursor, 'word_db')
+
+    if vector_cache_path and len(words) > 0:
+        write_vector_cache(vector_cache_path, words, vectors, run)
+        open_progress().count('load_lemma_vectors', 'cache_writes')
+    return words, vectors
+
+def check_simularity_matrix(words:list, memory_budget:int=memory_budget) -> int:
+    '''Compares every lemma added since the last build to every other lemma in blocked matrix products, and saves the pairs in bulk.
+    On the first build every lemma is new, so that's the whole upper triangle.'''
+
+    # Get all the lemma vectors in one matrix
+    words, vectors = load_lemma_vectors()
+    if len(words) < 2:
+        print(f"{clear_line}Not enough lemmas to compare {red}✘{white}", end="\n")
+        return 0
+
+    # Find the lemmas no build has compared yet
+    attach(sim_cursor, word_db_path, 'word_db')
+    sim_cursor.execute("SELECT word FROM words WHERE is_lemma = 1 AND NOT EXISTS (SELECT 1 FROM simularity_lemmas WHERE simularity_lemmas.word = words.word)")
+    new_lemmas = set(word for word, in sim_cursor.fetchall())
+    generation = (sim_cursor.execute("SELECT MAX(generation) FROM simularity_lemmas").fetchone()[0] or 0) + 1
+    detach(sim_cursor, 'word_db')
+
+    new_rows = [i for i, word in enumerate(words) if word in new_lemmas]
+    if len(new_rows) == 0:
+        print(f"{clear_line}No new lemmas to compare {green}✔{white}", end="\n")
+        return 0
+
+    # The tiles work straight off the vectors as they're stored, so a mapped vector cache is never copied
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = row_norms(matrix)
+
+    # A run over the same lemmas that was interrupted has saved every block before its checkpoint, so it carries on from there
+    run = fingerprint(words, [words[row] for row in new_rows], block_size(len(words), memory_budget))
+    first_block = start_stage(sim_cursor, 'check_simularity', run, {'simularity_mode': 'matrix', 'memory_budget': memory_budget}) or 0
+    sim_db.commit()
+    if first_block > 0:
+        print(f"{clear_line}Resuming from block {first_block} {green}✔{white}", end="\n")
+
+    # Only pairs with a new lemma in them need comparing. When every lemma is new that's just the upper triangle.
+    if len(new_rows) == len(words):
+        pairs = iter_upper_triangle(matrix, norms, memory_budget, first_block)
+    else:
+        pairs = iter_new_pairs(matrix, norms, new_rows, memory_budget, first_block)
 
-def get_matches(word, sim=0.5):
-    matches = []
-    sim_cursor.execute("SELECT word1, word2, sim FROM simularity WHERE word1 = ? OR word2 = ?", (word, word))
-    retrieved_matches = sim_cursor.fetchall()
-    for match in retrieved_matches:
-        if match[2] > float(sim):
-            matches.append(match[0] if match[0] != word else match[1])
-    longest = max([len(match) for match in matches])
-    return matches, longest
-        
+    # Compare the lemmas a tile at a time and save each tile in one go
+    total_pairs = len(new_rows) * (len(words) - 1) - len(new_rows) * (len(new_rows) - 1) // 2
+    new_similarities = 0
+    with open_progress().stage('check_simularity', total=total_pairs, title="Checking simularities for {}") as stage:
+        for block, rows, cols, sims in pairs:
+            sims = round_similarities(rows, cols, sims, matrix, norms)
+            sim_cursor.executemany(
+                "INSERT OR IGNORE INTO simularity (word1, word2, sim) VALUES (?, ?, ?)",
+                zip([words[row] for row in rows.tolist()], [words[col] for col in cols.tolist()], sims),
+            )
+            new_similarities += sim_cursor.rowcount
+
+            # Every block before this one is saved, and lands in the same commit as this tile
+            save_checkpoint(sim_cursor, 'check_simularity', block, stage.done + len(sims))
+            sim_db.commit()
+            stage.count('tiles')
+            stage.count('commits')
+            stage.advance(len(sims), words[rows[0]])
+
+        # Only now are the new lemmas done. If the run stopped early they'd just be compared again next time.
+        sim_cursor.executemany("INSERT OR IGNORE INTO simularity_lemmas (word, generation) VALUES (?, ?)", [(words[row], generation) for row in new_rows])
+        complete_stage(sim_cursor, 'check_simularity', total_pairs)
+        sim_db.commit()
+        stage.count('rows_written', new_similarities)
+        stage.count('commits')
 
+    print(f"{clear_line}Finished checking {total_pairs} simularities for {len(new_rows)} new lemmas {green}✔{white}", end="\n")
+    return new_similarities
 
+def build_neighbours(words:list, neighbour_count:int=neighbour_count, neighbour_floor:float=neighbour_floor, memory_budget:int=memory_budget) -> int:
+    '''Rebuilds the neighbour table with the top neighbour_count matches of every lemma. Returns how many neighbours were saved.'''
+
+    # Nothing to do if the table was last built from these same lemmas and settings
+    open_databases()
+    lemmas = [word for word, in word_cursor.execute(lemma_query)]
+    run = fingerprint(lemmas, neighbour_count, neighbour_floor)
+    if is_complete(sim_cursor, 'build_neighbours', run):
+        print(f"{clear_line}Neighbours are up to date for {len(lemmas)} lemmas {green}✔{white}", end="\n")
+        return 0
+
+    # Get all the lemma vectors in one matrix
+    words, vectors = load_lemma_vectors()
+    if len(words) < 2:
+        print(f"{clear_line}Not enough lemmas to compare {red}✘{white}", end="\n")
+        return 0
+
+    # The tiles work straight off the vectors as they're stored, so a mapped vector cache is never copied
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = row_norms(matrix)
+
+    # Every lemma's neighbours can change when a new lemma shows up, so the table is rebuilt in one transaction
+    start_stage(sim_cursor, 'build_neighbours', run, {'neighbour_count': neighbour_count, 'neighbour_floor': neighbour_floor})
+    sim_cursor.execute("DELETE FROM neighbours")
+    positions = {word: i for i, word in enumerate(words)}
+    saved = 0
+    batch = []
+    with open_progress().stage('build_neighbours', total=len(words), title="Finding neighbours for {}") as stage:
+        for row in neighbour_rows(words, matrix, norms, neighbour_count, neighbour_floor, memory_budget):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                stage.update(positions[row[0]], row[0])
+                sim_cursor.executemany("INSERT INTO neighbours (word, rank, other, sim) VALUES (?, ?, ?, ?)", batch)
+                saved += len(batch)
+                batch = []
+
+        sim_cursor.executemany("INSERT INTO neighbours (word, rank, other, sim) VALUES (?, ?, ?, ?)", batch)
+        saved += len(batch)
+        complete_stage(sim_cursor, 'build_neighbours', saved)
+        sim_db.commit()
+        stage.update(len(words))
+        stage.count('rows_written', saved)
+        stage.count('commits')
+
+    print(f"{clear_line}Finished finding neighbours for {len(words)} lemmas {green}✔{white}", end="\n")
+    return saved
+
+def cluster_lemmas(cluster_size:int=cluster_size, cluster_passes:int=cluster_passes, cluster_batch:int=cluster_batch, cluster_refinements:int=cluster_refinements, memory_budget:int=memory_budget) -> int:
+    '''Groups the lemmas into synonym buckets of about cluster_size and rebuilds the cluster table. Returns how many lemmas were clustered.
+    Works a batch or a block at a time within the memory budget, straight off the vector cache if there is one.'''
+
+    # Nothing to do if the table was last built from these same lemmas and settings
+    open_databases()
+    lemmas = [word for word, in word_cursor.execute(lemma_query)]
+    settings = {'cluster_size': cluster_size, 'cluster_passes': cluster_passes, 'cluster_batch': cluster_batch, 'cluster_refinements': cluster_refinements}
+    run = fingerprint(lemmas, settings)
+    if is_complete(sim_cursor, 'cluster_lemmas', run):
+        print(f"{clear_line}Clusters are up to date for {len(lemmas)} lemmas {green}✔{white}", end="\n")
+        return 0
+
+    words, vectors = load_lemma_vectors()
+    if len(words) < 2:
+        print(f"{clear_line}Not enough lemmas to cluster {red}✘{white}", end="\n")
+        return 0
+
+    clusters = max(1, round(len(words) / cluster_size))
+    steps = max(1, -(-len(words) * cluster_passes // cluster_batch))
+
+    # Every lemma can change bucket when the lemmas change, so the table is rebuilt in one transaction
+    start_stage(sim_cursor, 'cluster_lemmas', run, settings)
+    sim_cursor.execute("DELETE FROM clusters")
+    with open_progress().stage('cluster_lemmas', total=steps + len(words) * (cluster_refinements + 1), title="Clustering lemmas {}") as stage:
+        rows = iter_clusters(
+            words, vectors, clusters, memory_budget, steps, cluster_batch, cluster_refinements,
+            on_step=lambda: stage.advance(1, "(training)"), on_block=lambda count: stage.advance(count, "(assigning)"),
+        )
+        sim_cursor.executemany("INSERT INTO clusters (word, cluster_id, centroid_sim) VALUES (?, ?, ?)", rows)
+        saved = sim_cursor.rowcount
+        complete_stage(sim_cursor, 'cluster_lemmas', saved)
+        sim_db.commit()
+        stage.count('rows_written', saved)
+        stage.count('clusters', clusters)
+        stage.count('commits')
+
+    print(f"{clear_line}Finished clustering {saved} lemmas into {clusters} buckets {green}✔{white}", end="\n")
+    return saved
 
-def main():
-    # Start up
-    clear()
-    hide_cursor()
 
-    # PRAGMA
-    sim_cursor.execute("PRAGMA synchronous = OFF")
-    sim_cursor.execute("PRAGMA journal_mode = MEMORY")
-    sim_cursor.execute("PRAGMA temp_store = MEMORY")
-    sim_cursor.execute("PRAGMA cache_size = 10000")
+# Opened on the first lookup, once everything has been written
+query = None
+
+def get_matches(word, sim=0.5):
+    global query
+    if query is None:
+        query = SimularityQuery(sim_db_path, simularity_storage, cache_size)
+
+    # Most similar first, from either table. Repeat lookups come straight out of the cache.
+    hits = query.cache.hits
+    matches = [match for match, _ in query.matches(word, float(sim))]
+    open_progress().count('get_matches', 'lookups')
+    open_progress().count('get_matches', 'cache_hits', query.cache.hits - hits)
+    longest = max([len(match) for match in matches], default=0)
+    return matches, longest
+
+
+def get_canonical(word):
+    "Returns the canonical word of the synonym bucket word is in, or None if it isn't in one."
+    global query
+    if query is None:
+        query = SimularityQuery(sim_db_path, simularity_storage, cache_size)
+    canonical = query.canonical(word)
+    return None if canonical is None else canonical[0]
+
+
+def run_settings() -> dict:
+    "The settings that change what a run produces. A run with different ones isn't skipped, even over the same texts."
+    return {
+        'titles': titles,
+        'simularity_mode': simularity_mode,
+        'simularity_storage': simularity_storage,
+        'neighbour_count': neighbour_count,
+        'neighbour_floor': neighbour_floor,
+        'storage_backend': storage_backend,
+        'cluster_size': cluster_size,
+        'cluster_passes': cluster_passes,
+        'cluster_batch': cluster_batch,
+        'cluster_refinements': cluster_refinements,
+    }
+
+def index_simularities():
+    "Builds the simularity ordered indexes for band and top N queries, if they don't exist yet. Later builds keep them up to date."
+    print(f"{clear_line}Indexing simularities...", end="\r")
+    create_sim_indexes(sim_cursor)
+    sim_db.commit()
+
+def build():
+    "Runs every stage of the pipeline over the texts in titles, then prints what was found."
+    open_databases()
+
+    # Copy the separate databases into the single one the first time it's used
+    if storage_backend == 'single':
+        copied = migrate_stores(word_db, ['word_db.db', 'token_db.db', 'sim_db.db'])
+        if copied > 0:
+            print(f"{clear_line}Copied {copied} rows into {bank_path} {green}✔{white}", end="\n")
+
+    # Move any serialized Docs from older databases into the vector table
+    migrated = migrate_tokens(token_db, load_nlp, batch_size)
+    if migrated > 0:
+        print(f"{clear_line}Migrated {migrated} stored tokens to vectors {green}✔{white}", end="\n")
+
+    # Fold the separate lemma and nonlemma tables of older databases into the word table
+    migrated = migrate_lemma_tables(word_db)
+    if migrated > 0:
+        print(f"{clear_line}Migrated {migrated} classified lemmas into the word table {green}✔{white}", end="\n")
+
+    # If these exact texts were already run all the way through with these settings, there's nothing to do.
+        # The texts are recognised by their size and modification time, and only hashed again if those changed.
+        # Every database keeps its own record of the build, so one that was deleted or swapped out since gets built again.
+
+    settings = run_settings()
+    run = fingerprint(corpus_fingerprint(word_cursor, [f'{title}.txt' for title in titles]), settings)
+    word_db.commit()
+    databases = list({id(db): db for db in (word_db, token_db, sim_db)}.values())
+    if all(is_complete(db.cursor(), 'build', run) for db in databases):
+        index_simularities()
+        print(f"{clear_line}The texts and settings haven't changed since the last run, nothing to do {green}✔{white}", end="\n")
+        close_progress()
+        show_cursor()
+        input("Press any key to continue.")
+        return
+    for db in databases:
+        start_stage(db.cursor(), 'build', run, settings)
+        db.commit()
 
     # Process texts
     new_words, known_words, all_words = get_words()
     new_tokens, known_tokens, new_oov = tokenize_words(all_words)
 
     # get_lemmas MUST be done AFTER tokenize_words, because it skips over words that have no tokens. Which would be, like, all of them. Tokenize them first.
-    new_lemmas, known_lemmas, all_lemmas = get_lemmas(list(set(new_words) - set(new_oov)))
-    new_simularies = check_simularity(all_words)
+    new_lemmas, known_lemmas, all_lemmas = get_lemmas()
+    if simularity_storage == 'neighbours':
+        new_simularies = build_neighbours(all_words)
+    else:
+        new_simularies = check_simularity_matrix(all_words) if simularity_mode == 'matrix' else check_simularity(all_words)
+
+    index_simularities()
 
+    # Group the lemmas into synonym buckets
+    new_clusters = cluster_lemmas()
 
     # Close up
     print(f"{clear_line}Closing databases...", end="\r")
 
-    # Word database
-    word_db.commit()
-    word_db.close()
+    # Every stage finished, so the next run over the same texts can skip straight past them
+    for db in databases:
+        complete_stage(db.cursor(), 'build', len(all_words))
+        db.commit()
 
-    
-    # Token database
-    token_db.commit()
-    token_db.close()
+    # Word and token databases. With the single backend they're also the simularity database, which stays open for lookups.
+    for db in (word_db, token_db):
+        if db is not sim_db:
+            db.close()
 
-    sim_cursor.execute("PRAGMA synchronous = NORMAL")
+    # Every stage has reported by now
+    close_progress()
     
-    if len(new_words) + len(new_tokens) + len(new_oov) + len(new_lemmas) + new_simularies > 0:       
-        print(f"{clear_line}{up}{clear_line}{up}{clear_line}{up}{clear_line}{up}{clear_line}{up}{clear_line}{up}", end="\n")
+    if len(new_words) + len(new_tokens) + len(new_oov) + len(new_lemmas) + new_simularies + new_clusters > 0:       
+        print(f"{clear_line}{up}{clear_line}{up}{clear_line}{up}{clear_line}{up}{clear_line}{up}{clear_line}{up}{clear_line}{up}", end="\n")
         print(f"{clear_line}Finished {green}✔{white} {light_grey}")
         print(f"Processed {cyan}{len(all_words)}{white} words, found and cached:")
         print(f"  - {cyan}{len(new_words) if len(new_words) > 0 else "no"}{white} new {blue}words{white}")
@@ -465,16 +835,30 @@ def main():
         print(f"  - {cyan}{len(new_oov) if len(new_oov) > 0 else "no"}{white} new {purple}out-of-vocaulary words{white}") 
         print(f"  - {cyan}{len(new_lemmas) if len(new_lemmas) > 0 else "no"}{white} new {light_green}lemmas{white}.", end=f"{white}\n")
         print(f"  - {cyan}{new_simularies if new_simularies > 0 else "no"}{white} new {grey}simularities{white}.", end=f"{white}\n")
+        print(f"  - {cyan}{new_clusters if new_clusters > 0 else "no"}{white} newly clustered {bright_yellow}lemmas{white}.", end=f"{white}\n")
     else:
-        print(f"{clear_line}{up}{clear_line}{up}{clear_line}{up}{clear_line}{up}{clear_line}{up}{clear_line}{up}", end="\n")
+        print(f"{clear_line}{up}{clear_line}{up}{clear_line}{up}{clear_line}{up}{clear_line}{up}{clear_line}{up}{clear_line}{up}", end="\n")
         print(f"{clear_line}Processed {cyan}{len(all_words)}{white} words from {cyan}{len(titles)}{white} texts. No changes were detected {green}✔{white}", end="\n")
     show_cursor()
     input("Press any key to continue.")
+
+def main():
+    # Start up
+    clear()
+    hide_cursor()
+
+    # Build the bank, unless it's already built and only being queried
+    if not query_only:
+        build()
+    show_cursor()
     clear()
     word = input("Enter a word to check for simularities: ")
     sim = input("Enter a simularity threshold: ")
     while True:
         matches, longest = get_matches(word, sim)
+        canonical = get_canonical(word)
+        if canonical is not None and canonical != word:
+            print(f"{clear_line}{word} belongs with {cyan}{canonical}{white}")
         print(f"{clear_line}Matches for {word} at {sim} simularity:")
         for i in range(0, len(matches), 5):
             words = " ".join([f"[{word}]{" " * (longest + 2 - len(word)) if longest - 2 < (20 - len(word)) else " " * 20 - len(word)}"  for word in matches[i:i+5]])